@@ -0,0 +1,131 @@
+"""Peak RSS of keeping a large points.json in memory, as a dict versus as a CompactConfig.
+
+Usage: python benchmarks/config_memory.py --resources 500
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+
+def _data_object(name, cdc, data_attributes):
+    return {
+        'name': name,
+        'cdc': cdc,
+        'options': ['INST_MAG'] if cdc == 'MV' else [],
+        'isIntegerNotFloat': True,
+        'data_attributes': [
+            {'name': da_name, 'fc': fc, 'data_type': data_type}
+            for da_name, fc, data_type in data_attributes
+        ],
+    }
+
+
+def make_resource(code):
+    """A trading resource (ASR) shaped like the ones served to the Taipower platform."""
+    lln0 = {
+        'name': 'LLN0',
+        'data_objects': [_data_object('Mod', 'ENS', []), _data_object('Health', 'ENS', [])],
+        'data_sets': [],
+    }
+    logical_nodes = [lln0]
+    for i, product in enumerate(['SPI', 'SUP']):
+        logical_nodes.extend([
+            {'name': product + 'MMXU01', 'data_objects': [
+                _data_object('TotW', 'MV', [('mag.i', 'MX', 'int32')])]},
+            {'name': product + 'MMTR01', 'data_objects': [
+                _data_object('SupWh', 'BCR', [('actVal', 'ST', 'int64')]),
+                _data_object('DmdWh', 'BCR', [('actVal', 'ST', 'int64')])]},
+            {'name': product + 'ZBAT01', 'data_objects': [
+                _data_object('InBatV', 'MV', [('mag.i', 'MX', 'int32')]),
+                _data_object('BatSt', 'SPS', [('stVal', 'ST', 'boolean')])]},
+            {'name': product + 'GGIO01', 'data_objects': [
+                _data_object('AnIn1', 'MV', [('mag.i', 'MX', 'int32')]),
+                _data_object('AnIn2', 'MV', [('mag.i', 'MX', 'int32')])]},
+        ])
+        lln0['data_sets'].append({
+            'name': 'AI' + product,
+            'entries': [{'variable': product + variable} for variable in [
+                'MMXU01$MX$TotW$mag$i',
+                'MMTR01$ST$SupWh$actVal',
+                'MMTR01$ST$DmdWh$actVal',
+                'ZBAT01$MX$InBatV$mag$i',
+                'ZBAT01$ST$BatSt$stVal',
+                'GGIO01$MX$AnIn1$mag$i',
+                'GGIO01$MX$AnIn2$mag$i',
+            ]],
+            'reports': [{
+                'name': 'urcb0{}'.format(4 + i),
+                'report_id': 'urcb0{}'.format(4 + i),
+                'indexed': True,
+                'buffered': False,
+                'data_set': 'ASR{:05d}/LLN0$AI{}'.format(code, product),
+                'configuration_revision': 1,
+                'trigger_options': ['data_changed', 'integrity', 'general_interrogation'],
+                'report_options': ['sequence_number', 'time_stamp', 'data_set', 'reason_code'],
+                'buffer_time': 0,
+                'integrity_period': 60000,
+            }],
+        })
+    return {'name': 'ASR{:05d}'.format(code), 'logical_nodes': logical_nodes}
+
+
+def make_config(resources):
+    return {
+        'name': 'benchmark',
+        'logical_devices': [make_resource(code) for code in range(1, resources + 1)],
+    }
+
+
+def _measure(mode, path):
+    from config_loader import CompactConfig
+
+    tracemalloc.start()
+    if mode == 'dict':
+        with open(path) as f:
+            config = json.load(f)
+    else:
+        config = CompactConfig.load(path)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'retained_kb': retained // 1024,
+        'peak_allocated_kb': peak // 1024,
+    }))
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resources', default=500, type=int, help='number of ASR devices')
+    parser.add_argument('--measure', choices=['dict', 'compact'], help=argparse.SUPPRESS)
+    parser.add_argument('--config-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.config_path)
+        return 0
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+        json.dump(make_config(args.resources), f, indent=2)
+        f.flush()
+        results = {'resources': args.resources, 'config_bytes': os.path.getsize(f.name)}
+        for mode in ['dict', 'compact']:
+            # a fresh interpreter per mode, so the peak RSS of one does not hide the other
+            output = subprocess.run(
+                [sys.executable, __file__, '--measure', mode, '--config-path', f.name],
+                check=True, capture_output=True, text=True).stdout
+            results[mode] = json.loads(output)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Python-side memory of the runtime model, slotted nodes versus the former nested dicts.
+
+Needs the iec61850 bindings, run it where the proxy server runs.
+Usage: python benchmarks/model_memory.py --resources 500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+from config_memory import make_config  # noqa: E402
+
+
+def load_dict_model(name, ld_configs):
+    """The nested dict layout load_model produced before the slotted nodes."""
+    import iec61850
+    from model_loader import CDC_CREATORS, CONTROLLABLE_CDC, load_extra_do_args
+
+    model = {'inst': iec61850.IedModel_create(name), 'logical_devices': {}, 'data_attributes': {}}
+    for ld_config in ld_configs:
+        ld = {
+            'inst': iec61850.LogicalDevice_create(ld_config['name'], model['inst']),
+            'logical_nodes': {},
+        }
+        for ln_config in ld_config['logical_nodes']:
+            ln = {
+                'inst': iec61850.LogicalNode_create(ln_config['name'], ld['inst']),
+                'data_objects': {},
+            }
+            for do_config in ln_config.get('data_objects', []):
+                creator = CDC_CREATORS[do_config['cdc']]
+                do = {
+                    'inst': creator['fn'](
+                        do_config['name'], iec61850.toModelNode(ln['inst']),
+                        *load_extra_do_args(do_config, creator['extra_args'])),
+                    'controllable': do_config['cdc'] in CONTROLLABLE_CDC,
+                    'data_attributes': {},
+                    # added by get_data_objects on every iteration
+                    'path': '{}/{}.{}'.format(
+                        ld_config['name'], ln_config['name'], do_config['name']),
+                }
+                for da_config in do_config.get('data_attributes', []):
+                    child = iec61850.ModelNode_getChild(
+                        iec61850.toModelNode(do['inst']), da_config['name'])
+                    da = {
+                        'inst': iec61850.toDataAttribute(child),
+                        'data_type': da_config['data_type'],
+                    }
+                    do['data_attributes'][da_config['name']] = da
+                    model['data_attributes']['{}.{}'.format(do['path'], da_config['name'])] = da
+                ln['data_objects'][do_config['name']] = do
+            ld['logical_nodes'][ln_config['name']] = ln
+        model['logical_devices'][ld_config['name']] = ld
+    return model
+
+
+def _measure(layout, resources):
+    from model_loader import load_model
+
+    config = make_config(resources)
+    # data sets and RCBs only allocate native memory, leave them out of both layouts
+    for ld_config in config['logical_devices']:
+        for ln_config in ld_config['logical_nodes']:
+            ln_config.pop('data_sets', None)
+
+    tracemalloc.start()
+    if layout == 'dict':
+        model = load_dict_model(config['name'], config['logical_devices'])
+        data_attributes = len(model['data_attributes'])
+    else:
+        model = load_model(config['name'], config['logical_devices'], {})
+        data_attributes = len(model.data_attributes)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'data_attributes': data_attributes,
+        'retained_kb': retained // 1024,
+        'peak_allocated_kb': peak // 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--resources', default=500, type=int, help='number of ASR devices')
+    parser.add_argument('--measure', choices=['dict', 'slots'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        _measure(args.measure, args.resources)
+        return 0
+
+    results = {'resources': args.resources}
+    for layout in ['dict', 'slots']:
+        output = subprocess.run(
+            [sys.executable, __file__, '--measure', layout, '--resources', str(args.resources)],
+            check=True, capture_output=True, text=True).stdout
+        results[layout] = json.loads(output)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""Replay a traffic log recorded by the proxy server against a running proxy server.
+
+Updates are sent to the AncillaryInputs gRPC server, control commands are operated
+on the MMS server (needs the iec61850 bindings, skip them with --no-controls).
+Usage: python benchmarks/replay_traffic.py traffic.jsonl.gz --speed 10
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
+
+import grpc  # noqa: E402
+import taipower_ancillary_pb2  # noqa: E402
+import taipower_ancillary_pb2_grpc  # noqa: E402
+
+from traffic_recorder import read_traffic_log  # noqa: E402
+
+
+class ControlReplayer():
+    def __init__(self, host, port):
+        import iec61850
+
+        self._iec61850 = iec61850
+        self._conn = iec61850.IedConnection_create()
+        error = iec61850.IedConnection_connect(self._conn, host, port)
+        if error != iec61850.IED_ERROR_OK:
+            raise RuntimeError('Failed to connect to {}:{}, error: {}'.format(host, port, error))
+        self._control_clients = {}
+
+    def _new_value(self, value):
+        iec61850 = self._iec61850
+        if isinstance(value, bool):
+            return iec61850.MmsValue_newBoolean(value)
+        if isinstance(value, int):
+            return iec61850.MmsValue_newIntegerFromInt32(value)
+        if isinstance(value, float):
+            return iec61850.MmsValue_newFloat(value)
+        return None
+
+    def operate(self, command):
+        """Whether the command was accepted, None if it was not sent."""
+        iec61850 = self._iec61850
+        if command['path'] not in self._control_clients:
+            # None for a path the server does not have, the commands to it are skipped
+            self._control_clients[command['path']] = iec61850.ControlObjectClient_create(
+                command['path'], self._conn)
+        control_client = self._control_clients[command['path']]
+        if control_client is None:
+            print('Skip control command of unknown {}'.format(command['path']))
+            return None
+        ctl_val = self._new_value(command['value'])
+        if ctl_val is None:
+            print('Skip control command of {} with value {!r}'.format(
+                command['path'], command['value']))
+            return None
+        iec61850.ControlObjectClient_setOrigin(
+            control_client, None, command.get('originator_category', 0))
+        iec61850.ControlObjectClient_setTestMode(control_client, command['test'])
+        success = iec61850.ControlObjectClient_operate_no_gil(control_client, ctl_val, 0)
+        iec61850.MmsValue_delete(ctl_val)
+        return success
+
+    def close(self):
+        for control_client in self._control_clients.values():
+            if control_client is not None:
+                self._iec61850.ControlObjectClient_destroy(control_client)
+        self._iec61850.IedConnection_close(self._conn)
+        self._iec61850.IedConnection_destroy(self._conn)
+
+
+def replay(events, stub, control_replayer, speed, timeout):
+    """Send the events at speed times the recorded pace, as fast as possible when speed is 0."""
+    result = {'updates': 0, 'controls': 0, 'skipped_controls': 0, 'errors': 0, 'max_lag': 0}
+    first_t = None
+    started_at = time.monotonic()
+    for event in events:
+        if first_t is None:
+            first_t = event['t']
+        if speed > 0:
+            delay = started_at + (event['t'] - first_t) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                result['max_lag'] = max(result['max_lag'], -delay)
+
+        if 'update' in event:
+            try:
+                stub.update_point_values(
+                    taipower_ancillary_pb2.UpdatePointValuesRequest(
+                        values=json.dumps(event['update'])),
+                    timeout=timeout)
+                result['updates'] += 1
+            except grpc.RpcError as e:
+                print('Update failed: {}'.format(e.code()))
+                result['errors'] += 1
+        elif 'control' in event:
+            accepted = None if control_replayer is None else control_replayer.operate(
+                event['control'])
+            if accepted is None:
+                result['skipped_controls'] += 1
+            elif accepted:
+                result['controls'] += 1
+            else:
+                result['errors'] += 1
+
+    result['duration'] = time.monotonic() - started_at
+    events = result['updates'] + result['controls']
+    result['events_per_second'] = events / result['duration'] if result['duration'] else None
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('log_path', help='traffic log written by the recorder of the proxy server')
+    parser.add_argument('--grpc-address', default='localhost:61850')
+    parser.add_argument('--host', default='localhost', help='host of the MMS server')
+    parser.add_argument('--port', default=102, type=int, help='port of the MMS server')
+    parser.add_argument('--speed', default=1, type=float,
+                        help='multiple of the recorded pace, 0 replays as fast as possible')
+    parser.add_argument('--no-controls', action='store_true', help='replay the updates only')
+    parser.add_argument('--timeout', default=10, type=float, help='seconds per update call')
+    args = parser.parse_args()
+
+    channel = grpc.insecure_channel(args.grpc_address)
+    stub = taipower_ancillary_pb2_grpc.AncillaryInputsStub(channel)
+    control_replayer = None if args.no_controls else ControlReplayer(args.host, args.port)
+    try:
+        result = replay(
+            read_traffic_log(args.log_path), stub, control_replayer, args.speed, args.timeout)
+    finally:
+        if control_replayer is not None:
+            control_replayer.close()
+        channel.close()
+    print(json.dumps(dict(result, speed=args.speed), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,11 @@
 import arrow
 import contextlib
 import datetime
+import functools
+import json
+import os
 import random
-import re
+import sys
 import threading
 import time
 
@@ -10,6 +13,10 @@ import fire
 
 import iec61850
 
+# shared with the dummy client, next to this file in the image
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from latency_stats import percentile  # noqa: E402
+
 
 @contextlib.contextmanager
 def ied_connect(host, port):
@@ -19,9 +26,42 @@ def ied_connect(host, port):
 
     yield conn
 
+    release_control_objects(conn)
     iec61850.IedConnection_destroy(conn)
 
 
+# ControlObjectClient of each (connection, reference), created once and reused for every command
+_control_objects = {}
+_control_objects_lock = threading.Lock()
+
+
+def get_control_object(connection, reference):
+    key = (id(connection), reference)
+    with _control_objects_lock:
+        control_object = _control_objects.get(key)
+        if control_object is None:
+            control_object = iec61850.ControlObjectClient_create(reference, connection)
+            iec61850.ControlObjectClient_setOrigin(
+                control_object, None, iec61850.CONTROL_ORCAT_REMOTE_CONTROL
+            )
+            _control_objects[key] = control_object
+        return control_object
+
+
+def release_control_objects(connection):
+    with _control_objects_lock:
+        for key in [key for key in _control_objects if key[0] == id(connection)]:
+            iec61850.ControlObjectClient_destroy(_control_objects.pop(key))
+
+
+def read_rss_kb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
 def split_timestamp(timestamp_64):
     """Split 64-bit timestamp into high and low 32-bit parts."""
     low = timestamp_64 & 0xFFFFFFFF
@@ -36,109 +76,137 @@ def combine_timestamp(high, low):
     return timestamp_64
 
 
-def handle_report_group_event(dataset_directory, report):
-    rcb_reference = iec61850.ClientReport_getRcbReference(
-        report
-    )  # ASG90001/LLN0.RP.diurcb04
-    report_id = iec61850.ClientReport_getRptId(report)
+# reason for why an entry is included in a report
+REASONS = {
+    iec61850.IEC61850_REASON_DATA_CHANGE: "data change",
+    iec61850.IEC61850_REASON_QUALITY_CHANGE: "quality change",
+    iec61850.IEC61850_REASON_DATA_UPDATE: "data update",
+    iec61850.IEC61850_REASON_INTEGRITY: "integrity",
+    iec61850.IEC61850_REASON_GI: "general interrogation",
+}
+
+# RCB and data set references of each kind of report
+REPORT_CONTROL_BLOCKS = {
+    "group": lambda code, product: (
+        f"ASG{code:05d}/LLN0.RP.urcb0101",
+        f"ASG{code:05d}/LLN0.AIGRO",
+    ),
+    "group_event": lambda code, product: (
+        f"ASG{code:05d}/LLN0.RP." + {"SPI": "diurcb0301", "SUP": "diurcb0401"}[product],
+        f"ASG{code:05d}/LLN0.DI{product}",
+    ),
+    "resource": lambda code, product: (
+        f"ASR{code:05d}/LLN0.RP." + {"SPI": "urcb0401", "SUP": "urcb0501"}[product],
+        f"ASR{code:05d}/LLN0.AI{product}",
+    ),
+}
+
+
+def subscribe_report(conn, rcb_reference, dataset_reference, handler, prepare=None, gi=True):
+    """Install the handler and enable the RCB, return the RCB and the data set directory.
+
+    prepare(rcb, dataset_directory) is called before the first report can arrive, the handler
+    is called with its result instead of the data set directory.
+    """
+    rcb, error = iec61850.IedConnection_getRCBValues(conn, rcb_reference, None)
+    if error != iec61850.IED_ERROR_OK:
+        print(f"Get RCB values of {rcb_reference} failed, error: {error}")
+        return None, None
+    dataset_directory, error = iec61850.IedConnection_getDataSetDirectory(
+        conn, dataset_reference, None
+    )
+    if error != iec61850.IED_ERROR_OK:
+        print(f"Get data set directory of {dataset_reference} failed, error: {error}")
+        return None, None
+    parameter = dataset_directory
+    if prepare is not None:
+        parameter = prepare(rcb, dataset_directory)
+
+    context = iec61850.transformReportHandlerContext((None, handler, parameter, rcb_reference))
+    iec61850.IedConnection_installReportHandler(
+        conn,
+        rcb_reference,
+        iec61850.ClientReportControlBlock_getRptId(rcb),
+        iec61850.ReportHandlerProxy,
+        context,
+    )
+
+    # enable the report
+    iec61850.ClientReportControlBlock_setRptEna(rcb, True)
+    iec61850.ClientReportControlBlock_setGI(rcb, gi)
+    error = iec61850.IedConnection_setRCBValues(
+        conn,
+        rcb,
+        iec61850.RCB_ELEMENT_RPT_ENA | (iec61850.RCB_ELEMENT_GI if gi else 0),
+        True,
+    )
+    if error != iec61850.IED_ERROR_OK:
+        print(f"Enable {rcb_reference} failed, error: {error}")
+        return None, None
+    return rcb, dataset_directory
+
+
+def dataset_references(dataset_directory):
+    return [
+        iec61850.toCharP(iec61850.LinkedList_get(dataset_directory, i).data)
+        for i in range(iec61850.LinkedList_size(dataset_directory))
+    ]
+
+
+def print_report_header(report):
+    print(f"Report Control Block: {iec61850.ClientReport_getRcbReference(report)}")
+    print(f"Report ID: {iec61850.ClientReport_getRptId(report)}")
     generated_time = datetime.datetime.fromtimestamp(
         iec61850.ClientReport_getTimestamp(report) / 1000
     )
-    print(f"Report Control Block: {rcb_reference}")
-    print(f"Report ID: {report_id}")
     print(f"Report Generation Time: {generated_time}")
 
-    match = re.search(
-        r"ASG(?P<group_code>\d+)/LLN0\.RP\.(?P<report_name>.+)", rcb_reference
-    )
-    group_code = int(match.group("group_code"))
-    report_name = match.group("report_name")
-    product = {
-        "diurcb0301": "SPI",
-        "diurcb0401": "SUP",
-    }.get(report_name, "Unknown")
 
-    dataset_values = iec61850.ClientReport_getDataSetValues(report)
+GROUP_EVENT_NOTES = {
+    "GGIO01.Ind1.stVal[ST]": "履行待命服務開始",
+    "GGIO02.Ind1.stVal[ST]": "履行待命服務結束",
+    "GGIO03.Ind1.stVal[ST]": "回報接獲執行指令",
+    "GGIO04.Ind1.stVal[ST]": "回報接獲結束指令",
+    "GGIO05.Ind1.stVal[ST]": "回報執行結束",
+}
 
-    def read_dataset_entry(i):
-        # reason for why this entry is included in the report
-        reason_code = iec61850.ClientReport_getReasonForInclusion(report, i)
-        reason = {
-            iec61850.IEC61850_REASON_DATA_CHANGE: "data change",
-            iec61850.IEC61850_REASON_QUALITY_CHANGE: "quality change",
-            iec61850.IEC61850_REASON_DATA_UPDATE: "data update",
-            iec61850.IEC61850_REASON_INTEGRITY: "integrity",
-            iec61850.IEC61850_REASON_GI: "general interrogation",
-        }.get(reason_code, "unknown")
-
-        # data reference
-        entry = iec61850.LinkedList_get(dataset_directory, i)
-        reference = iec61850.toCharP(entry.data)
-
-        # value
-        mms_value = iec61850.MmsValue_getElement(dataset_values, i)
-        value = iec61850.MmsValue_getBoolean(mms_value)
 
-        # note
-        note = {
-            f"ASG{group_code:05d}/{product}GGIO01.Ind1.stVal[ST]": "履行待命服務開始",
-            f"ASG{group_code:05d}/{product}GGIO02.Ind1.stVal[ST]": "履行待命服務結束",
-            f"ASG{group_code:05d}/{product}GGIO03.Ind1.stVal[ST]": "回報接獲執行指令",
-            f"ASG{group_code:05d}/{product}GGIO04.Ind1.stVal[ST]": "回報接獲結束指令",
-            f"ASG{group_code:05d}/{product}GGIO05.Ind1.stVal[ST]": "回報執行結束",
-        }[reference]
-
-        return reference, {"value": value, "reason": reason, "note": note}
-
-    result = {
-        reference: data
-        for reference, data in [
-            read_dataset_entry(i)
-            for i in range(iec61850.LinkedList_size(dataset_directory))
-        ]
+def compile_group_event_decoders(dataset_directory, group_code, product):
+    """(reference, converter, note) of every entry of the data set"""
+    notes = {
+        f"ASG{group_code:05d}/{product}{suffix}": note
+        for suffix, note in GROUP_EVENT_NOTES.items()
     }
+    return [
+        (reference, iec61850.MmsValue_getBoolean, notes[reference])
+        for reference in dataset_references(dataset_directory)
+    ]
 
-    # Print values of the report
-    for reference, data in result.items():
-        print(f"{data['note']} {reference}: {data['value']} due to {data['reason']}")
+
+def handle_report_group_event(decoders, report):
+    print_report_header(report)
+    dataset_values = iec61850.ClientReport_getDataSetValues(report)
+    for i, (reference, convert, note) in enumerate(decoders):
+        reason = REASONS.get(iec61850.ClientReport_getReasonForInclusion(report, i), "unknown")
+        value = convert(iec61850.MmsValue_getElement(dataset_values, i))
+        print(f"{note} {reference}: {value} due to {reason}")
 
 
 def report_group_event(
     group_code=90001, product="SUP", host="localhost", port=102
 ):  # SPI or SUP
-    rcb_reference = {
-        "SPI": f"ASG{group_code:05d}/LLN0.RP.diurcb0301",
-        "SUP": f"ASG{group_code:05d}/LLN0.RP.diurcb0401",
-    }[product]
-    dataset_reference = f"ASG{group_code:05d}/LLN0.DI{product}"
+    rcb_reference, dataset_reference = REPORT_CONTROL_BLOCKS["group_event"](
+        group_code, product
+    )
     with ied_connect(host, port) as conn:
-        # get RCB object from server
-        rcb, _ = iec61850.IedConnection_getRCBValues(conn, rcb_reference, None)
-
-        # install the report handler
-        dataset_directory, _ = iec61850.IedConnection_getDataSetDirectory(
-            conn, dataset_reference, None
-        )
-        context = iec61850.transformReportHandlerContext(
-            (None, handle_report_group_event, dataset_directory, rcb_reference)
-        )
-        iec61850.IedConnection_installReportHandler(
+        subscribe_report(
             conn,
             rcb_reference,
-            iec61850.ClientReportControlBlock_getRptId(rcb),
-            iec61850.ReportHandlerProxy,
-            context,
-        )
-
-        # enable the report
-        iec61850.ClientReportControlBlock_setRptEna(rcb, True)
-        iec61850.ClientReportControlBlock_setGI(rcb, True)
-        iec61850.IedConnection_setRCBValues(
-            conn,
-            rcb,
-            iec61850.RCB_ELEMENT_RPT_ENA
-            | iec61850.RCB_ELEMENT_GI,  # parameter mast define which parameter to set
-            True,
+            dataset_reference,
+            handle_report_group_event,
+            lambda rcb, dataset_directory: compile_group_event_decoders(
+                dataset_directory, group_code, product
+            ),
         )
 
         # wait for reports
@@ -146,109 +214,62 @@ def report_group_event(
             time.sleep(10)
 
 
-def handle_report_group(dataset_directory, report):
-    rcb_reference = iec61850.ClientReport_getRcbReference(report)
-    report_id = iec61850.ClientReport_getRptId(report)
-    generated_time = datetime.datetime.fromtimestamp(
-        iec61850.ClientReport_getTimestamp(report) / 1000
-    )
-    print(f"Report Control Block: {rcb_reference}")
-    print(f"Report ID: {report_id}")
-    print(f"Report Generation Time: {generated_time}")
-
-    dataset_values = iec61850.ClientReport_getDataSetValues(report)
-
-    def read_dataset_entry(i):
-        # reason for why this entry is included in the report
-        reason_code = iec61850.ClientReport_getReasonForInclusion(report, i)
-        reason = {
-            iec61850.IEC61850_REASON_DATA_CHANGE: "data change",
-            iec61850.IEC61850_REASON_QUALITY_CHANGE: "quality change",
-            iec61850.IEC61850_REASON_DATA_UPDATE: "data update",
-            iec61850.IEC61850_REASON_INTEGRITY: "integrity",
-            iec61850.IEC61850_REASON_GI: "general interrogation",
-        }.get(reason_code, "unknown")
-
-        # data reference
-        entry = iec61850.LinkedList_get(dataset_directory, i)
-        reference = iec61850.toCharP(entry.data)
+GROUP_CONVERTERS = {
+    "GROMMTR01.SupWh.actVal[ST]": iec61850.MmsValue_toInt64,
+}
+
+GROUP_NOTES = {
+    "QSEGGIO01.IntIn1.stVal[ST]": "合格交易者代碼",
+    "QSEGGIO01.IntIn2.stVal[ST]": "報價代碼",
+    "QSEGGIO01.IntIn3.stVal[ST]": "輔助服務商品",
+    "GROMMXU01.TotW.mag.i[MX]": "該報價代碼所聚合交易資源之該分鐘加總實功率。。當為用電情形時，此欄位為負值；執行逆送時，此欄位為正值。",
+    "GROGGIO01.AnIn1.mag.i[MX]": "Unix Timestamp-H",
+    "GROGGIO01.AnIn2.mag.i[MX]": "Unix Timestamp-L",
+    # "GROMMXU02.TotW.mag.i[MX]": "即時備轉、補充備轉，此欄位為 0",
+    # "GROGGIO02.AnIn1.mag.i[MX]": "Unix Timestamp-H",
+    # "GROMMTR01.SupWh.actVal[ST]": "交易資源為未獲同意可執行逆送之需量反應提供者，此欄位為 0",
+    "GROMMTR01.DmdWh.actVal[ST]": "報價代碼聚合之所有交易資源加總之累計用電量",
+    "GROGGIO11.AnIn1.mag.i[MX]": "執行率計算時間點 Unix Timestamp-H",
+    "GROGGIO11.AnIn2.mag.i[MX]": "執行率計算時間點 Unix Timestamp-L",
+    "GROGGIO11.AnIn3.mag.i[MX]": "執行率。若輔助服務商品為即時備轉或補充備轉者，當不處於調度事件執行期間，此欄位填入 0 為代表",
+}
+
+
+def format_unix_time(mms_value):
+    timestamp = iec61850.MmsValue_toInt32(mms_value)
+    return arrow.get(timestamp).to("Asia/Taipei").format("YYYY-MM-DD HH:mm:ss")
+
+
+def compile_group_decoders(dataset_directory):
+    """(reference, converter, note) of every entry of the data set"""
+    decoders = []
+    for reference in dataset_references(dataset_directory):
         ln_do_da = reference.split("/")[-1]
+        convert = GROUP_CONVERTERS.get(ln_do_da, iec61850.MmsValue_toInt32)
+        if reference.endswith("AnIn2.mag.i[MX]"):
+            convert = format_unix_time
+        decoders.append((reference, convert, GROUP_NOTES.get(ln_do_da, "不重要")))
+    return decoders
 
-        # value
-        mms_value = iec61850.MmsValue_getElement(dataset_values, i)
-        value = {"GROMMTR01.SupWh.actVal[ST]": iec61850.MmsValue_toInt64,}.get(
-            ln_do_da, iec61850.MmsValue_toInt32
-        )(mms_value)
-
-        # note
-        note = {
-            "QSEGGIO01.IntIn1.stVal[ST]": "合格交易者代碼",
-            "QSEGGIO01.IntIn2.stVal[ST]": "報價代碼",
-            "QSEGGIO01.IntIn3.stVal[ST]": "輔助服務商品",
-            "GROMMXU01.TotW.mag.i[MX]": "該報價代碼所聚合交易資源之該分鐘加總實功率。。當為用電情形時，此欄位為負值；執行逆送時，此欄位為正值。",
-            "GROGGIO01.AnIn1.mag.i[MX]": "Unix Timestamp-H",
-            "GROGGIO01.AnIn2.mag.i[MX]": "Unix Timestamp-L",
-            # "GROMMXU02.TotW.mag.i[MX]": "即時備轉、補充備轉，此欄位為 0",
-            # "GROGGIO02.AnIn1.mag.i[MX]": "Unix Timestamp-H",
-            # "GROMMTR01.SupWh.actVal[ST]": "交易資源為未獲同意可執行逆送之需量反應提供者，此欄位為 0",
-            "GROMMTR01.DmdWh.actVal[ST]": "報價代碼聚合之所有交易資源加總之累計用電量",
-            "GROGGIO11.AnIn1.mag.i[MX]": "執行率計算時間點 Unix Timestamp-H",
-            "GROGGIO11.AnIn2.mag.i[MX]": "執行率計算時間點 Unix Timestamp-L",
-            "GROGGIO11.AnIn3.mag.i[MX]": "執行率。若輔助服務商品為即時備轉或補充備轉者，當不處於調度事件執行期間，此欄位填入 0 為代表",
-        }.get(ln_do_da, "不重要")
-
-        return reference, {"value": value, "reason": reason, "note": note}
-
-    result = {
-        reference: data
-        for reference, data in [
-            read_dataset_entry(i)
-            for i in range(iec61850.LinkedList_size(dataset_directory))
-        ]
-    }
 
-    # Print values of the report
-    for reference, data in result.items():
-        if reference.endswith("AnIn2.mag.i[MX]"):
-            value = (
-                arrow.get(data["value"]).to("Asia/Taipei").format("YYYY-MM-DD HH:mm:ss")
-            )
-        else:
-            value = data["value"]
-        print(f"{reference}: {value} ({data['reason']}), {data['note']}")
+def handle_report_group(decoders, report):
+    print_report_header(report)
+    dataset_values = iec61850.ClientReport_getDataSetValues(report)
+    for i, (reference, convert, note) in enumerate(decoders):
+        reason = REASONS.get(iec61850.ClientReport_getReasonForInclusion(report, i), "unknown")
+        value = convert(iec61850.MmsValue_getElement(dataset_values, i))
+        print(f"{reference}: {value} ({reason}), {note}")
 
 
 def report_group(group_code=90001, host="localhost", port=102):
-    rcb_reference = f"ASG{group_code:05d}/LLN0.RP.urcb0101"
-    dataset_reference = f"ASG{group_code:05d}/LLN0.AIGRO"
+    rcb_reference, dataset_reference = REPORT_CONTROL_BLOCKS["group"](group_code, None)
     with ied_connect(host, port) as conn:
-        # get RCB object from server
-        rcb, _ = iec61850.IedConnection_getRCBValues(conn, rcb_reference, None)
-
-        # install the report handler
-        dataset_directory, _ = iec61850.IedConnection_getDataSetDirectory(
-            conn, dataset_reference, None
-        )
-        context = iec61850.transformReportHandlerContext(
-            (None, handle_report_group, dataset_directory, rcb_reference)
-        )
-        iec61850.IedConnection_installReportHandler(
+        subscribe_report(
             conn,
             rcb_reference,
-            iec61850.ClientReportControlBlock_getRptId(rcb),
-            iec61850.ReportHandlerProxy,
-            context,
-        )
-
-        # enable the report
-        iec61850.ClientReportControlBlock_setRptEna(rcb, True)
-        iec61850.ClientReportControlBlock_setGI(rcb, True)
-        iec61850.IedConnection_setRCBValues(
-            conn,
-            rcb,
-            iec61850.RCB_ELEMENT_RPT_ENA
-            | iec61850.RCB_ELEMENT_GI,  # parameter mast define which parameter to set
-            True,
+            dataset_reference,
+            handle_report_group,
+            lambda rcb, dataset_directory: compile_group_decoders(dataset_directory),
         )
 
         # wait for reports
@@ -256,83 +277,67 @@ def report_group(group_code=90001, host="localhost", port=102):
             time.sleep(10)
 
 
-def handle_report_resource(dataset_directory, report):
-    print(
-        "Report Control Block: {}".format(iec61850.ClientReport_getRcbReference(report))
-    )
-    print("Report ID: {}".format(iec61850.ClientReport_getRptId(report)))
-    print(
-        "Report Generation Time: {}".format(
-            datetime.datetime.fromtimestamp(
-                iec61850.ClientReport_getTimestamp(report) / 1000
+RESOURCE_CONVERTERS = {
+    "TotW.mag.i[MX]": iec61850.MmsValue_toInt32,
+    "SupWh.actVal[ST]": iec61850.MmsValue_toInt64,
+    "DmdWh.actVal[ST]": iec61850.MmsValue_toInt64,
+    "InBatV.mag.i[MX]": iec61850.MmsValue_toInt32,
+    "BatSt.stVal[ST]": iec61850.MmsValue_getBoolean,
+    "AnIn1.mag.i[MX]": iec61850.MmsValue_toInt32,
+    "AnIn2.mag.i[MX]": iec61850.MmsValue_toInt32,
+}
+
+RESOURCE_NOTES = {
+    "TotW.mag.i[MX]": "瞬時輸出/入總實功率(kW) (int32)",
+    "SupWh.actVal[ST]": "瞬時累計輸出/發電電能量(kWh) (int64)",
+    "DmdWh.actVal[ST]": "瞬時累計輸入/用電電能量(kWh) (int64)",
+    "InBatV.mag.i[MX]": "儲能系統瞬時剩餘電量 SOC(0.01kWh), 自用發電設備 M2 交易表計總實功率 (int32)",
+    "BatSt.stVal[ST]": "儲能系統/發電設備狀態, 用戶狀態 (boolean)",
+    "AnIn1.mag.i[MX]": "每分鐘時間點[Unix Timestamp-H] (int32)",
+    "AnIn2.mag.i[MX]": "每分鐘時間點[Unix Timestamp-L] (int32)",
+}
+
+
+def compile_resource_decoders(dataset_directory):
+    """(reference, converter, note) of every entry of the data set, and the entry indexes of
+    the high and low parts of the timestamp"""
+    decoders = []
+    for data_reference in dataset_references(dataset_directory):
+        # ASR00001/SPIMMXU01.TotW.mag.i[MX]
+        attribute_reference = data_reference.split("/")[-1]  # SPIMMXU01.TotW.mag.i[MX]
+        attribute_name = attribute_reference.split(".", 1)[1]  # TotW.mag.i[MX]
+        decoders.append(
+            (
+                data_reference,
+                RESOURCE_CONVERTERS[attribute_name],
+                RESOURCE_NOTES[attribute_name],
             )
         )
-    )
+    # 每分鐘時間點[Unix Timestamp-H], endswith AnIn1.mag.i[MX]
+    high_index = [
+        i for i, (reference, _, _) in enumerate(decoders) if reference.endswith("AnIn1.mag.i[MX]")
+    ][0]
+    # 每分鐘時間點[Unix Timestamp-L], endswith AnIn2.mag.i[MX]
+    low_index = [
+        i for i, (reference, _, _) in enumerate(decoders) if reference.endswith("AnIn2.mag.i[MX]")
+    ][0]
+    return decoders, high_index, low_index
 
-    dataset_values = iec61850.ClientReport_getDataSetValues(report)
 
-    def read_dataset_entry(i):
-        # reason for why this entry is included in the report
-        reason_code = iec61850.ClientReport_getReasonForInclusion(report, i)
-        reason = {
-            iec61850.IEC61850_REASON_DATA_CHANGE: "data change",
-            iec61850.IEC61850_REASON_QUALITY_CHANGE: "quality change",
-            iec61850.IEC61850_REASON_DATA_UPDATE: "data update",
-            iec61850.IEC61850_REASON_INTEGRITY: "integrity",
-            iec61850.IEC61850_REASON_GI: "general interrogation",
-        }.get(reason_code, "unknown")
-
-        # data reference
-        entry = iec61850.LinkedList_get(dataset_directory, i)
-        data_reference = iec61850.toCharP(
-            entry.data
-        )  # ASR00001/SPIMMXU01.TotW.mag.i[MX]
-
-        # value
-        attribute_reference = data_reference.split("/")[-1]  # SPIMMXU01.TotW.mag.i[MX]
-        attribute_name = attribute_reference.split(".", 1)[1]  # TotW.mag.i[MX]
-        mms_value = iec61850.MmsValue_getElement(dataset_values, i)
-        value = {
-            "TotW.mag.i[MX]": iec61850.MmsValue_toInt32,
-            "SupWh.actVal[ST]": iec61850.MmsValue_toInt64,
-            "DmdWh.actVal[ST]": iec61850.MmsValue_toInt64,
-            "InBatV.mag.i[MX]": iec61850.MmsValue_toInt32,
-            "BatSt.stVal[ST]": iec61850.MmsValue_getBoolean,
-            "AnIn1.mag.i[MX]": iec61850.MmsValue_toInt32,
-            "AnIn2.mag.i[MX]": iec61850.MmsValue_toInt32,
-        }[attribute_name](mms_value)
-
-        note = {
-            "TotW.mag.i[MX]": "瞬時輸出/入總實功率(kW) (int32)",
-            "SupWh.actVal[ST]": "瞬時累計輸出/發電電能量(kWh) (int64)",
-            "DmdWh.actVal[ST]": "瞬時累計輸入/用電電能量(kWh) (int64)",
-            "InBatV.mag.i[MX]": "儲能系統瞬時剩餘電量 SOC(0.01kWh), 自用發電設備 M2 交易表計總實功率 (int32)",
-            "BatSt.stVal[ST]": "儲能系統/發電設備狀態, 用戶狀態 (boolean)",
-            "AnIn1.mag.i[MX]": "每分鐘時間點[Unix Timestamp-H] (int32)",
-            "AnIn2.mag.i[MX]": "每分鐘時間點[Unix Timestamp-L] (int32)",
-        }[attribute_name]
-
-        return data_reference, value, reason, note
-
-    result = {
-        data_reference: {"value": value, "reason": reason, "note": note}
-        for (data_reference, value, reason, note) in [
-            read_dataset_entry(i)
-            for i in range(iec61850.LinkedList_size(dataset_directory))
-        ]
-    }
-
-    # Print values of the report
-    for reference, value in result.items():
-        print(f"{value['note']} because {value['reason']}")
-        print(f"{reference}: {value['value']}\n")
+def handle_report_resource(compiled, report):
+    decoders, high_index, low_index = compiled
+    print_report_header(report)
+    dataset_values = iec61850.ClientReport_getDataSetValues(report)
+    values = []
+    for i, (reference, convert, note) in enumerate(decoders):
+        reason = REASONS.get(iec61850.ClientReport_getReasonForInclusion(report, i), "unknown")
+        value = convert(iec61850.MmsValue_getElement(dataset_values, i))
+        values.append(value)
+        print(f"{note} because {reason}")
+        print(f"{reference}: {value}\n")
 
     # Print timestamp of the report
-    # 每分鐘時間點[Unix Timestamp-H], endswith AnIn1.mag.i[MX]
-    high = [v for k, v in result.items() if k.endswith("AnIn1.mag.i[MX]")][0]["value"]
-    # 每分鐘時間點[Unix Timestamp-L], endswith AnIn2.mag.i[MX]
-    low = [v for k, v in result.items() if k.endswith("AnIn2.mag.i[MX]")][0]["value"]
-    timestamp = combine_timestamp(high=high, low=low)
+    timestamp = combine_timestamp(high=values[high_index], low=values[low_index])
     print(
         f"每分鐘時機點: {arrow.get(timestamp).to('Asia/Taipei').format('YYYY-MM-DD HH:mm:ss')}"
     )
@@ -341,43 +346,14 @@ def handle_report_resource(dataset_directory, report):
 def report_resource(
     resource_code=1, product="SUP", host="localhost", port=102
 ):  # SPI or SUP
-    rcb_reference = {
-        "SPI": f"ASR{resource_code:05d}/LLN0.RP.urcb0401",
-        "SUP": f"ASR{resource_code:05d}/LLN0.RP.urcb0501",
-    }[product]
-    dataset_reference = {
-        "SPI": f"ASR{resource_code:05d}/LLN0.AISPI",
-        "SUP": f"ASR{resource_code:05d}/LLN0.AISUP",
-    }[product]
-
+    rcb_reference, dataset_reference = REPORT_CONTROL_BLOCKS["resource"](resource_code, product)
     with ied_connect(host, port) as conn:
-        # get RCB object from server
-        rcb, _ = iec61850.IedConnection_getRCBValues(conn, rcb_reference, None)
-
-        # install the report handler
-        dataset_directory, _ = iec61850.IedConnection_getDataSetDirectory(
-            conn, dataset_reference, None
-        )
-        context = iec61850.transformReportHandlerContext(
-            (None, handle_report_resource, dataset_directory, rcb_reference)
-        )
-        iec61850.IedConnection_installReportHandler(
+        subscribe_report(
             conn,
             rcb_reference,
-            iec61850.ClientReportControlBlock_getRptId(rcb),
-            iec61850.ReportHandlerProxy,
-            context,
-        )
-
-        # enable the report
-        iec61850.ClientReportControlBlock_setRptEna(rcb, True)
-        iec61850.ClientReportControlBlock_setGI(rcb, True)
-        iec61850.IedConnection_setRCBValues(
-            conn,
-            rcb,
-            iec61850.RCB_ELEMENT_RPT_ENA
-            | iec61850.RCB_ELEMENT_GI,  # parameter mast define which parameter to set
-            True,
+            dataset_reference,
+            handle_report_resource,
+            lambda rcb, dataset_directory: compile_resource_decoders(dataset_directory),
         )
 
         # wait for reports
@@ -385,21 +361,218 @@ def report_resource(
             time.sleep(10)
 
 
+def parse_codes(codes):
+    """Codes given as 1, (1, 2, 3) or "1-100" (inclusive) on the command line."""
+    if isinstance(codes, int):
+        return [codes]
+    if isinstance(codes, str):
+        codes = codes.split(",")
+    result = []
+    for code in codes:
+        if isinstance(code, str) and "-" in code:
+            first, last = map(int, code.split("-"))
+            result.extend(range(first, last + 1))
+        else:
+            result.append(int(code))
+    return result
+
+
+def print_mms_value(mms_value):
+    return iec61850.MmsValue_printToBuffer(mms_value, 1024)[0]
+
+
+MMS_CONVERTERS = {
+    iec61850.MMS_BOOLEAN: iec61850.MmsValue_getBoolean,
+    iec61850.MMS_INTEGER: iec61850.MmsValue_toInt64,
+    iec61850.MMS_UNSIGNED: iec61850.MmsValue_toUint32,
+    iec61850.MMS_FLOAT: iec61850.MmsValue_toFloat,
+}
+
+
+class ReportRecorder:
+    """Write every received report as a JSON line and keep statistics per RCB."""
+
+    def __init__(self, f):
+        self._f = f
+        self._lock = threading.Lock()
+        self._rcbs = {}
+
+    def add_rcb(self, rcb_reference, rcb, dataset_directory):
+        """Return the state of the RCB, passed to handle_report with every report."""
+        buffered = iec61850.ClientReportControlBlock_isBuffered(rcb)
+        entries = dataset_references(dataset_directory)
+        with self._lock:
+            # the values of the reports are written in the order of these entries
+            self._f.write(json.dumps({"rcb": rcb_reference, "entries": entries}) + "\n")
+            state = self._rcbs[rcb_reference] = {
+                "rcb": rcb_reference,
+                # converters are resolved from the value types of the first report
+                "converters": None,
+                # SqNum is INT8U in unbuffered and INT16U in buffered reports
+                "modulo": 1 << 16 if buffered else 1 << 8,
+                "count": 0,
+                "first_received_at": None,
+                "last_received_at": None,
+                "last_seq_num": None,
+                "missing": 0,
+                "gaps": 0,
+                "latencies": [],
+            }
+        return state
+
+    def handle_report(self, stats, report):
+        received_at = time.time()
+        generated_at = None
+        if iec61850.ClientReport_hasTimestamp(report):
+            generated_at = iec61850.ClientReport_getTimestamp(report) / 1000
+        seq_num = None
+        if iec61850.ClientReport_hasSeqNum(report):
+            seq_num = iec61850.ClientReport_getSeqNum(report)
+
+        dataset_values = iec61850.ClientReport_getDataSetValues(report)
+        converters = stats["converters"]
+        if converters is None:
+            converters = stats["converters"] = [
+                MMS_CONVERTERS.get(
+                    iec61850.MmsValue_getType(iec61850.MmsValue_getElement(dataset_values, i)),
+                    print_mms_value,
+                )
+                for i in range(iec61850.MmsValue_getArraySize(dataset_values))
+            ]
+        not_included = iec61850.IEC61850_REASON_NOT_INCLUDED
+        values = [
+            convert(iec61850.MmsValue_getElement(dataset_values, i))
+            if iec61850.ClientReport_getReasonForInclusion(report, i) != not_included
+            else None
+            for i, convert in enumerate(converters)
+        ]
+
+        record = {
+            "rcb": stats["rcb"],
+            "received_at": received_at,
+            "generated_at": generated_at,
+            "seq_num": seq_num,
+            "values": values,
+        }
+        with self._lock:
+            self._f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            stats["count"] += 1
+            if stats["first_received_at"] is None:
+                stats["first_received_at"] = received_at
+            stats["last_received_at"] = received_at
+            if generated_at is not None:
+                stats["latencies"].append(received_at - generated_at)
+            if seq_num is not None:
+                if stats["last_seq_num"] is not None:
+                    missing = (seq_num - stats["last_seq_num"] - 1) % stats["modulo"]
+                    if missing:
+                        stats["missing"] += missing
+                        stats["gaps"] += 1
+                stats["last_seq_num"] = seq_num
+
+    def summary(self):
+        def latency_ms(latencies):
+            latencies = sorted(latencies)
+            return {
+                name: None if not latencies else percentile(latencies, p) * 1000
+                for name, p in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]
+            }
+
+        with self._lock:
+            rcbs = {}
+            for rcb_reference, stats in self._rcbs.items():
+                span = (stats["last_received_at"] or 0) - (stats["first_received_at"] or 0)
+                rcbs[rcb_reference] = {
+                    "reports": stats["count"],
+                    "rate": (stats["count"] - 1) / span if span > 0 else None,
+                    "gaps": stats["gaps"],
+                    "missing_reports": stats["missing"],
+                    "latency_ms": latency_ms(stats["latencies"]),
+                }
+            return {
+                "rcbs": len(self._rcbs),
+                "reports": sum(stats["count"] for stats in self._rcbs.values()),
+                "rcbs_without_reports": sorted(
+                    rcb for rcb, stats in self._rcbs.items() if not stats["count"]
+                ),
+                "gaps": sum(stats["gaps"] for stats in self._rcbs.values()),
+                "missing_reports": sum(stats["missing"] for stats in self._rcbs.values()),
+                "latency_ms": latency_ms(
+                    [latency for stats in self._rcbs.values() for latency in stats["latencies"]]
+                ),
+                "per_rcb": rcbs,
+            }
+
+
+def record_reports(
+    group_codes=90001,
+    resource_codes=1,
+    products=("SPI", "SUP"),
+    kinds=("group", "group_event", "resource"),
+    output="reports.jsonl",
+    duration=60,
+    connections=1,
+    host="localhost",
+    port=102,
+):
+    """Record reports of many RCBs to a JSONL file and print latency, rate and gaps
+
+    Codes may be given as 90001, 90001,90002 or 90001-90100.
+    The first line of each RCB lists its data set entries, each report is a line of
+    {"rcb", "received_at", "generated_at", "seq_num", "values"}.
+    The latency is the receipt time minus the report timestamp, the clocks of both
+    hosts need to be synchronized.
+    """
+    products = [products] if isinstance(products, str) else list(products)
+    kinds = [kinds] if isinstance(kinds, str) else list(kinds)
+    subscriptions = set()
+    for kind in kinds:
+        codes = parse_codes(resource_codes if kind == "resource" else group_codes)
+        for code in codes:
+            for product in products:
+                subscriptions.add(REPORT_CONTROL_BLOCKS[kind](code, product))
+    subscriptions = sorted(subscriptions)
+
+    with open(output, "w") as f, contextlib.ExitStack() as stack:
+        recorder = ReportRecorder(f)
+        conns = [stack.enter_context(ied_connect(host, port)) for _ in range(connections)]
+        rcbs = []
+        for i, (rcb_reference, dataset_reference) in enumerate(subscriptions):
+            conn = conns[i % len(conns)]
+            rcb, _ = subscribe_report(
+                conn,
+                rcb_reference,
+                dataset_reference,
+                recorder.handle_report,
+                functools.partial(recorder.add_rcb, rcb_reference),
+            )
+            if rcb is not None:
+                rcbs.append((conn, rcb))
+        print(f"Recording {len(rcbs)} of {len(subscriptions)} RCBs for {duration}s to {output}")
+
+        time.sleep(duration)
+
+        for conn, rcb in rcbs:
+            iec61850.ClientReportControlBlock_setRptEna(rcb, False)
+            iec61850.IedConnection_setRCBValues(conn, rcb, iec61850.RCB_ELEMENT_RPT_ENA, True)
+            iec61850.ClientReportControlBlock_destroy(rcb)
+
+    print(json.dumps(recorder.summary(), indent=2))
+
+
 def send_command(annotation, connection, reference, value):
-    """Send a command to the IED Server"""
-    print(f"{annotation}: {reference} = {value}")
-    control_object = iec61850.ControlObjectClient_create(reference, connection)
-    iec61850.ControlObjectClient_setOrigin(
-        control_object, None, iec61850.CONTROL_ORCAT_REMOTE_CONTROL
-    )
-    iec61850.ControlObjectClient_operate(
-        control_object,
-        {
-            int: iec61850.MmsValue_newIntegerFromInt32,
-            bool: iec61850.MmsValue_newBoolean,
-        }[type(value)](value),
-        0,
-    )
+    """Send a command to the IED Server, nothing is printed when annotation is None"""
+    if annotation is not None:
+        print(f"{annotation}: {reference} = {value}")
+    control_object = get_control_object(connection, reference)
+    ctl_val = {
+        int: iec61850.MmsValue_newIntegerFromInt32,
+        bool: iec61850.MmsValue_newBoolean,
+    }[type(value)](value)
+    # the GIL is released while waiting for the server, commands sent together overlap
+    success = iec61850.ControlObjectClient_operate_no_gil(control_object, ctl_val, 0)
+    iec61850.MmsValue_delete(ctl_val)
+    return success
 
 
 def notify(group_code=90001, product="SUP", host="localhost", port=102):  # SPI or SUP
@@ -430,6 +603,140 @@ def notify(group_code=90001, product="SUP", host="localhost", port=102):  # SPI
         send_command("平台復歸", conn, f"ASG{group_code:05d}/{product}GAPC01.SPCSO1", False)
 
 
+def send_activate_commands(conn, group_code, capacity, product):
+    """送出即時備轉啟動指令及其 AO，順序隨機"""
+    threads = []
+
+    # AO: 啟動指令發出時間
+    command_submit_time = int(time.time())
+    _, submit_timestamp_low = split_timestamp(command_submit_time)
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "啟動指令發出時間(Unix Timestamp-L)",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO01.AnOut2",
+                submit_timestamp_low,
+            ),
+        )
+    )
+
+    # AO: 指令服務開始時間
+    start_execute_time = command_submit_time // 3600 * 3600 + 3600  # 下個整點
+    _, start_timestamp_low = split_timestamp(start_execute_time)
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "指令服務開始時間(Unix Timestamp-L)",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO02.AnOut2",
+                start_timestamp_low,
+            ),
+        )
+    )
+
+    # AO: 指令服務結束時間
+    end_execute_time = start_execute_time + 3600  # 執行一小時
+    _, end_timestamp_low = split_timestamp(end_execute_time)
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "指令服務結束時間(Unix Timestamp-L)",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO05.AnOut2",
+                end_timestamp_low,
+            ),
+        )
+    )
+
+    # AO: 指令執行容量
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "指令執行容量",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO03.AnOut1",
+                capacity * 100,  # 單位為 0.01MW。所以乘上 100 倍後發送指令。
+            ),
+        )
+    )
+
+    # DO: 啟動指令
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "啟動指令",
+                conn,
+                f"ASG{group_code:05d}/{product}GAPC02.SPCSO1",
+                True,
+            ),
+        )
+    )
+
+    # 送出指令
+    random.shuffle(threads)
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+
+def send_deactivate_commands(conn, group_code, product):
+    """送出即時備轉結束指令及其 AO，順序隨機"""
+    threads = []
+
+    # AO: 結束指令發出時間
+    command_submit_time = int(time.time())
+    _, submit_timestamp_low = split_timestamp(command_submit_time)
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "結束指令發出時間(Unix Timestamp-L)",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO04.AnOut2",
+                submit_timestamp_low,
+            ),
+        )
+    )
+
+    # AO: 指令服務結束時間
+    end_execute_time = command_submit_time  # 馬上結束
+    _, end_timestamp_low = split_timestamp(end_execute_time)
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "指令服務結束時間(Unix Timestamp-L)",
+                conn,
+                f"ASG{group_code:05d}/{product}GGIO05.AnOut2",
+                end_timestamp_low,
+            ),
+        )
+    )
+
+    # DO: 結束指令
+    threads.append(
+        threading.Thread(
+            target=send_command,
+            args=(
+                "結束指令",
+                conn,
+                f"ASG{group_code:05d}/{product}GAPC03.SPCSO1",
+                True,
+            ),
+        )
+    )
+
+    # 送出指令
+    random.shuffle(threads)
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+
+
 def activate(
     group_code=90001,
     capacity=1,  # 單位為 MW。乘上 100 倍後發送指令。
@@ -458,83 +765,7 @@ def activate(
     - capacity: 指令執行容量，單位為 MW。
     """
     with ied_connect(host, port) as conn:
-        threads = []
-
-        # AO: 啟動指令發出時間
-        command_submit_time = int(time.time())
-        _, submit_timestamp_low = split_timestamp(command_submit_time)
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "啟動指令發出時間(Unix Timestamp-L)",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO01.AnOut2",
-                    submit_timestamp_low,
-                ),
-            )
-        )
-
-        # AO: 指令服務開始時間
-        start_execute_time = command_submit_time // 3600 * 3600 + 3600  # 下個整點
-        _, start_timestamp_low = split_timestamp(start_execute_time)
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "指令服務開始時間(Unix Timestamp-L)",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO02.AnOut2",
-                    start_timestamp_low,
-                ),
-            )
-        )
-
-        # AO: 指令服務結束時間
-        end_execute_time = start_execute_time + 3600  # 執行一小時
-        _, end_timestamp_low = split_timestamp(end_execute_time)
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "指令服務結束時間(Unix Timestamp-L)",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO05.AnOut2",
-                    end_timestamp_low,
-                ),
-            )
-        )
-
-        # AO: 指令執行容量
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "指令執行容量",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO03.AnOut1",
-                    capacity * 100,  # 單位為 0.01MW。所以乘上 100 倍後發送指令。
-                ),
-            )
-        )
-
-        # DO: 啟動指令
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "啟動指令",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GAPC02.SPCSO1",
-                    True,
-                ),
-            )
-        )
-
-        # 送出指令
-        random.shuffle(threads)
-        [thread.start() for thread in threads]
-        [thread.join() for thread in threads]
+        send_activate_commands(conn, group_code, capacity, product)
 
         # 確認合格交易者有收到指令
         command_received_reference = f"ASG{group_code:05d}/{product}GGIO03.Ind1.stVal"
@@ -542,6 +773,7 @@ def activate(
             conn, command_received_reference, iec61850.IEC61850_FC_ST
         )
         value = iec61850.MmsValue_getBoolean(mms_value)
+        iec61850.MmsValue_delete(mms_value)
         assert value is True, "回報接獲執行指令狀態異常，應為 True"
 
         time.sleep(3)
@@ -551,6 +783,7 @@ def activate(
             conn, command_received_reference, iec61850.IEC61850_FC_ST
         )
         value = iec61850.MmsValue_getBoolean(mms_value)
+        iec61850.MmsValue_delete(mms_value)
         assert value is False, "回報接獲執行指令在 2.5 秒後未被復歸，應為 False"
 
 
@@ -569,55 +802,7 @@ def deactivate(
     - True: 結束指令
     """
     with ied_connect(host, port) as conn:
-        threads = []
-
-        # AO: 結束指令發出時間
-        command_submit_time = int(time.time())
-        _, submit_timestamp_low = split_timestamp(command_submit_time)
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "結束指令發出時間(Unix Timestamp-L)",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO04.AnOut2",
-                    submit_timestamp_low,
-                ),
-            )
-        )
-
-        # AO: 指令服務結束時間
-        end_execute_time = command_submit_time  # 馬上結束
-        _, end_timestamp_low = split_timestamp(end_execute_time)
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "指令服務結束時間(Unix Timestamp-L)",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GGIO05.AnOut2",
-                    end_timestamp_low,
-                ),
-            )
-        )
-
-        # DO: 結束指令
-        threads.append(
-            threading.Thread(
-                target=send_command,
-                args=(
-                    "結束指令",
-                    conn,
-                    f"ASG{group_code:05d}/{product}GAPC03.SPCSO1",
-                    True,
-                ),
-            )
-        )
-
-        # 送出指令
-        random.shuffle(threads)
-        [thread.start() for thread in threads]
-        [thread.join() for thread in threads]
+        send_deactivate_commands(conn, group_code, product)
 
         # 確認合格交易者有收到指令
         command_received_reference = f"ASG{group_code:05d}/{product}GGIO04.Ind1.stVal"
@@ -625,6 +810,7 @@ def deactivate(
             conn, command_received_reference, iec61850.IEC61850_FC_ST
         )
         value = iec61850.MmsValue_getBoolean(mms_value)
+        iec61850.MmsValue_delete(mms_value)
         assert value is True, "回報接獲結束指令狀態異常，應為 True"
 
         time.sleep(3)
@@ -634,18 +820,212 @@ def deactivate(
             conn, command_received_reference, iec61850.IEC61850_FC_ST
         )
         value = iec61850.MmsValue_getBoolean(mms_value)
+        iec61850.MmsValue_delete(mms_value)
         assert value is False, "回報接獲結束指令在 2.5 秒後未被復歸，應為 False"
         print(f"{command_received_reference}: {value}")
 
 
+# the acknowledgement point of each action, which must be reset within the deadline
+STRESS_ACTIONS = {
+    "activate": "GGIO03.Ind1.stVal",  # 回報接獲執行指令
+    "deactivate": "GGIO04.Ind1.stVal",  # 回報接獲結束指令
+}
+
+
+def wait_for_state(conn, reference, state, deadline, interval):
+    """Poll the boolean point until it equals state, return the time or None at the deadline."""
+    while True:
+        res = iec61850.IedConnection_readObject_no_gil(conn, reference, iec61850.IEC61850_FC_ST)
+        now = time.monotonic()
+        if res is not None and not isinstance(res, int):
+            mms_value, error = res
+            if error == iec61850.IED_ERROR_OK:
+                value = iec61850.MmsValue_getBoolean(mms_value)
+                iec61850.MmsValue_delete(mms_value)
+                if value == state:
+                    return now
+        if now >= deadline:
+            return None
+        time.sleep(interval)
+
+
+def time_action(conn, action, group_code, capacity, product, timeout, interval):
+    reference = f"ASG{group_code:05d}/{product}{STRESS_ACTIONS[action]}"
+    sent_at = time.monotonic()
+    if action == "activate":
+        send_activate_commands(conn, group_code, capacity, product)
+    else:
+        send_deactivate_commands(conn, group_code, product)
+    acked_at = wait_for_state(conn, reference, True, sent_at + timeout, interval)
+    reset_at = None
+    if acked_at is not None:
+        reset_at = wait_for_state(conn, reference, False, sent_at + timeout, interval)
+    return {
+        "group_code": group_code,
+        "action": action,
+        "time_to_ack": None if acked_at is None else acked_at - sent_at,
+        "time_to_reset": None if reset_at is None else reset_at - sent_at,
+    }
+
+
+def stress(
+    group_codes="90001-90010",
+    actions=("activate", "deactivate"),
+    capacity=1,
+    product="SUP",  # SPI or SUP
+    fail_percentile=99,
+    deadline=2.5,
+    timeout=10,
+    interval=0.01,
+    connections=1,
+    host="localhost",
+    port=102,
+):
+    """同時對多個報價代碼送出啟動／結束指令，統計回報接獲指令及其復歸的時間
+
+    Every group is dispatched at the same time, its acknowledgement point is polled every
+    interval seconds. time_to_ack and time_to_reset are measured from the dispatch of the
+    commands. Fails when the fail_percentile of time_to_reset is over the deadline, or when
+    a group does not acknowledge or reset within timeout.
+    """
+    codes = parse_codes(group_codes)
+    actions = [actions] if isinstance(actions, str) else list(actions)
+    results = []
+    with contextlib.ExitStack() as stack:
+        conns = [stack.enter_context(ied_connect(host, port)) for _ in range(connections)]
+        for action in actions:
+            action_results = [None] * len(codes)
+
+            def run(i, code):
+                action_results[i] = time_action(
+                    conns[i % len(conns)], action, code, capacity, product, timeout, interval
+                )
+
+            threads = [
+                threading.Thread(target=run, args=(i, code)) for i, code in enumerate(codes)
+            ]
+            [thread.start() for thread in threads]
+            [thread.join() for thread in threads]
+            results.extend(action_results)
+
+    summary = {"deadline": deadline, "fail_percentile": fail_percentile, "actions": {}}
+    failed = False
+    for action in actions:
+        action_results = [result for result in results if result["action"] == action]
+        timings = {}
+        for key in ["time_to_ack", "time_to_reset"]:
+            values = sorted(result[key] for result in action_results if result[key] is not None)
+            timings[key] = {
+                name: percentile(values, p)
+                for name, p in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]
+            }
+        resets = sorted(
+            result["time_to_reset"]
+            for result in action_results
+            if result["time_to_reset"] is not None
+        )
+        missing = [
+            result["group_code"] for result in action_results if result["time_to_reset"] is None
+        ]
+        over_deadline = [
+            result["group_code"]
+            for result in action_results
+            if result["time_to_reset"] is not None and result["time_to_reset"] > deadline
+        ]
+        if missing or (resets and percentile(resets, fail_percentile) > deadline):
+            failed = True
+        summary["actions"][action] = dict(
+            timings,
+            groups=len(action_results),
+            not_acked_or_reset=missing,
+            over_deadline=over_deadline,
+        )
+    summary["passed"] = not failed
+    print(json.dumps({"summary": summary, "results": results}, indent=2))
+    if failed:
+        sys.exit(1)
+
+
+def soak(
+    group_code=90001,
+    product="SUP",
+    duration=3600,
+    interval=0.1,
+    report_interval=60,
+    host="localhost",
+    port=102,
+):  # SPI or SUP
+    """長時間反覆送出通知指令並讀取回報點位，定期印出 RSS，確認記憶體不會持續成長
+
+    Every interval seconds the notify point is toggled and the acknowledgement point is read.
+    A JSON line with the elapsed time, the operations and the RSS of this process is printed
+    every report_interval seconds. The growth is measured from the first report, after the
+    connection and the control objects are set up.
+    """
+    control_reference = f"ASG{group_code:05d}/{product}GAPC01.SPCSO1"
+    read_reference = f"ASG{group_code:05d}/{product}GGIO03.Ind1.stVal"
+    samples = []
+    with ied_connect(host, port) as conn:
+        started_at = time.monotonic()
+        next_report_at = started_at
+        operations = errors = 0
+        value = False
+        while time.monotonic() - started_at < duration:
+            value = not value
+            if not send_command(None, conn, control_reference, value):
+                errors += 1
+            res = iec61850.IedConnection_readObject_no_gil(
+                conn, read_reference, iec61850.IEC61850_FC_ST
+            )
+            if res is None or isinstance(res, int) or res[1] != iec61850.IED_ERROR_OK:
+                errors += 1
+            else:
+                iec61850.MmsValue_delete(res[0])
+            operations += 2
+
+            now = time.monotonic()
+            if now >= next_report_at:
+                sample = {
+                    "elapsed": now - started_at,
+                    "operations": operations,
+                    "errors": errors,
+                    "rss_kb": read_rss_kb(),
+                }
+                samples.append(sample)
+                print(json.dumps(sample))
+                next_report_at += report_interval
+            time.sleep(interval)
+
+    first, last = samples[0], samples[-1]
+    hours = (last["elapsed"] - first["elapsed"]) / 3600
+    print(
+        json.dumps(
+            {
+                "operations": operations,
+                "errors": errors,
+                "rss_first_kb": first["rss_kb"],
+                "rss_last_kb": last["rss_kb"],
+                "rss_max_kb": max(sample["rss_kb"] for sample in samples),
+                "rss_growth_kb_per_hour": (last["rss_kb"] - first["rss_kb"]) / hours
+                if hours
+                else None,
+            },
+            indent=2,
+        )
+    )
+
+
 if __name__ == "__main__":
     fire.Fire(
         {
             "report_group_event": report_group_event,  # 報價代碼事件回報，例如履行待命服務開始、結束
             "report_group": report_group,  # 報價代碼狀態回報，總輸出功率
             "report_resource": report_resource,  # 交易資源狀態回報，例如輸出功率
+            "record_reports": record_reports,  # 記錄多個 RCB 的報告，統計延遲與遺失
             "activate": activate,  # 即時備轉啟動指令
             "deactivate": deactivate,  # 即時備轉結束指令
+            "soak": soak,  # 長時間反覆送出指令，定期印出 RSS
+            "stress": stress,  # 多個報價代碼同時啟動／結束，統計回報及復歸時間
             "notify": notify,  # 電量不足／SOC 準備量不足／機組剩餘可用量不足
         }
     )
@@ -0,0 +1,294 @@
+import json
+import os
+import tempfile
+import zlib
+
+
+CHUNK_SIZE = 1 << 16
+WHITESPACE = ' \t\r\n'
+
+
+class _JsonStream():
+    """Decode JSON values one by one from a file without reading the whole file."""
+
+    def __init__(self, f):
+        self._f = f
+        self._buffer = ''
+        self._pos = 0
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # grow the read size with the buffer, so a large value is not rescanned too often
+        chunk = self._f.read(max(CHUNK_SIZE, len(self._buffer) - self._pos))
+        if not chunk:
+            return False
+        self._buffer = self._buffer[self._pos:] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, chars):
+        char = self.peek()
+        if char == '' or char not in chars:
+            raise ValueError('Expected one of {!r} in config, got {!r}'.format(chars, char))
+        self._pos += 1
+        return char
+
+    def decode(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            # a number may continue in the next chunk
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+
+def iter_model_config(f):
+    """Yield the top-level (key, value) pairs of a model config file.
+
+    Logical devices are yielded one at a time as ('logical_device', device) instead of
+    a single ('logical_devices', [...]), so the whole list is never held in memory.
+    """
+    stream = _JsonStream(f)
+    stream.expect('{')
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.decode()
+        stream.expect(':')
+        if key == 'logical_devices':
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.expect(']')
+            else:
+                while True:
+                    yield 'logical_device', stream.decode()
+                    if stream.expect(',]') == ']':
+                        break
+        else:
+            yield key, stream.decode()
+        if stream.expect(',}') == '}':
+            return
+
+
+def _has_placeholder(value):
+    if isinstance(value, str):
+        return '{' in value
+    if isinstance(value, list):
+        return any(_has_placeholder(item) for item in value)
+    if isinstance(value, dict):
+        return any(_has_placeholder(item) for item in value.values())
+    return False
+
+
+def _substitute(value, fields):
+    if isinstance(value, str):
+        return value.format(**fields) if '{' in value else value
+    if isinstance(value, list):
+        return [_substitute(item, fields) for item in value]
+    if isinstance(value, dict):
+        return {key: _substitute(item, fields) for key, item in value.items()}
+    return value
+
+
+class DeviceTemplate():
+    """Logical nodes shared by many devices, strings may refer to {name} and {code} of a device."""
+
+    def __init__(self, name, logical_nodes):
+        self.name = name
+        self._logical_nodes = logical_nodes
+        self._has_placeholders = _has_placeholder(logical_nodes)
+
+    def instantiate(self, name, code=None):
+        if not self._has_placeholders:
+            # shared by every device, the config is never modified while loading
+            return self._logical_nodes
+        try:
+            return _substitute(self._logical_nodes, {'name': name, 'code': code})
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            # e.g. {code:05d} in a template used by a device without codes
+            raise ValueError('Template {} cannot be instantiated for {} (code {!r}): {!r}'.format(
+                self.name, name, code, e))
+
+
+def compile_templates(configs, validate=None):
+    templates = {}
+    for name, config in configs.items():
+        if validate is not None:
+            validate(config['logical_nodes'])
+        templates[name] = DeviceTemplate(name, config['logical_nodes'])
+    return templates
+
+
+def expand_logical_devices(devices):
+    """Expand {"name": "ASR{code:05d}", "template": "ASR", "codes": [...]} per code."""
+    for device in devices:
+        codes = device.get('codes')
+        if 'code_range' in device:
+            first, last = device['code_range']
+            codes = range(first, last + 1)
+        if codes is None:
+            yield device
+            continue
+        for code in codes:
+            yield {'name': device['name'].format(code=code), 'template': device['template'],
+                   'code': code}
+
+
+def resolve_logical_device(device, templates):
+    if 'template' not in device:
+        return device
+    if device['template'] not in templates:
+        raise ValueError('Unknown template {} of {}'.format(device['template'], device['name']))
+    template = templates[device['template']]
+    return {
+        'name': device['name'],
+        'logical_nodes': template.instantiate(device['name'], device.get('code')),
+    }
+
+
+def iter_resolved_logical_devices(path, header):
+    """Yield the logical devices of a model config file, expanded and resolved.
+
+    The other top-level keys are put in header. Devices are resolved as they are parsed,
+    so name and templates must come before logical_devices.
+    """
+    templates = None
+    with open(path) as f:
+        for key, value in iter_model_config(f):
+            if key != 'logical_device':
+                header[key] = value
+                continue
+            if 'name' not in header:
+                raise ValueError('name must come before logical_devices in {}'.format(path))
+            if templates is None:
+                templates = compile_templates(header.get('templates', {}))
+            for device in expand_logical_devices([value]):
+                if 'template' in device and 'templates' not in header:
+                    raise ValueError(
+                        'templates must come before logical_devices in {}'.format(path))
+                yield resolve_logical_device(device, templates)
+
+
+def _compact(device):
+    return zlib.compress(json.dumps(device, separators=(',', ':')).encode())
+
+
+def _expand(compact_device):
+    return json.loads(zlib.decompress(compact_device))
+
+
+def _codes_of(device):
+    if 'code_range' in device:
+        first, last = device['code_range']
+        return range(first, last + 1)
+    return device.get('codes')
+
+
+def _device_key(device):
+    # entries expanded per code share a name format, they are told apart by their template
+    if 'codes' in device or 'code_range' in device:
+        return (device['name'], device['template'])
+    return device['name']
+
+
+class CompactConfig():
+    """Model config which keeps every logical device as compressed JSON instead of dicts."""
+
+    def __init__(self, header, devices=()):
+        self.header = header  # everything except the logical devices
+        self._devices = {}
+        for device in devices:
+            self.add_logical_device(device)
+
+    @classmethod
+    def load(cls, path):
+        config = cls({})
+        with open(path) as f:
+            for key, value in iter_model_config(f):
+                if key == 'logical_device':
+                    config.add_logical_device(value)
+                else:
+                    config.header[key] = value
+        return config
+
+    @property
+    def name(self):
+        return self.header['name']
+
+    def get(self, key, default=None):
+        return self.header.get(key, default)
+
+    def has_logical_device(self, key):
+        return key in self._devices
+
+    def get_logical_device(self, key):
+        return _expand(self._devices[key])
+
+    def diff_logical_devices(self, other):
+        """Keys of the logical devices added, removed and changed in other.
+
+        A key is the name of a device, or (name format, template) of devices expanded per code.
+        """
+        added = [name for name in other._devices if name not in self._devices]
+        removed = [name for name in self._devices if name not in other._devices]
+        changed = [name for name, compact_device in other._devices.items()
+                   if name in self._devices and self._devices[name] != compact_device]
+        return added, removed, changed
+
+    def add_logical_device(self, device):
+        key = _device_key(device)
+        if isinstance(key, tuple) and key in self._devices:
+            # the same name format and template twice, one entry with the codes of both
+            codes = set(_codes_of(_expand(self._devices[key]))) | set(_codes_of(device))
+            device = {'name': device['name'], 'template': device['template'],
+                      'codes': sorted(codes)}
+        self._devices[key] = _compact(device)
+
+    def reset_logical_devices(self, devices):
+        self._devices = {}
+        for device in devices:
+            self.add_logical_device(device)
+
+    def iter_logical_devices(self):
+        for compact_device in list(self._devices.values()):
+            yield _expand(compact_device)
+
+    def save(self, path):
+        # written aside and renamed over the file, readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(path)), prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('{\n')
+                for key, value in self.header.items():
+                    f.write('  {}: {},\n'.format(
+                        json.dumps(key), json.dumps(value, indent=2).replace('\n', '\n  ')))
+                f.write('  "logical_devices": [')
+                for i, device in enumerate(self.iter_logical_devices()):
+                    f.write(',\n    ' if i else '\n    ')
+                    f.write(json.dumps(device, indent=2).replace('\n', '\n    '))
+                f.write('\n  ]\n}\n' if self._devices else ']\n}\n')
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(path):
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -1,25 +1,81 @@
 import argparse
+import json
+import random
+import threading
 import time
 import iec61850
+from latency_stats import percentile
 from model_loader import load_model, get_mms_loader
 
 
+# operations of the load generator and the model entries they pick their targets from
+OPERATION_TARGETS = {
+    'read_point': 'points',
+    'read_data_set': 'data_sets',
+    'operate': 'controls',
+}
+OPERATIONS = list(OPERATION_TARGETS)
+
+# ctlVal of the i-th operation, for the CDCs the load generator operates
+CONTROL_VALUES = {
+    'SPC': lambda i: iec61850.MmsValue_newBoolean(i % 2 == 0),
+    'DPC': lambda i: iec61850.MmsValue_newBoolean(i % 2 == 0),
+    'INC': lambda i: iec61850.MmsValue_newIntegerFromInt32(i % 100),
+    'ENC': lambda i: iec61850.MmsValue_newIntegerFromInt32(i % 2),
+    'ISC': lambda i: iec61850.MmsValue_newIntegerFromInt32(i % 64),
+}
+
+
+def element_indexes(spec, child):
+    """Indexes of the structure elements leading to child (e.g. mag$i), None if not found."""
+    indexes = []
+    for name in child.split('$'):
+        for i in range(iec61850.MmsVariableSpecification_getSize(spec)):
+            child_spec = iec61850.MmsVariableSpecification_getChildSpecificationByIndex(spec, i)
+            if iec61850.MmsVariableSpecification_getName(child_spec) == name:
+                indexes.append(i)
+                spec = child_spec
+                break
+        else:
+            return None
+    return indexes
+
+
+def summarize_latencies(latencies, errors, duration):
+    latencies = sorted(latencies)
+    summary = {
+        'count': len(latencies),
+        'errors': errors,
+        'throughput': len(latencies) / duration,
+    }
+    for p in [50, 95, 99]:
+        value = percentile(latencies, p)
+        summary['p{}_ms'.format(p)] = None if value is None else value * 1000
+    summary['max_ms'] = latencies[-1] * 1000 if latencies else None
+    return summary
+
+
 class DummyClient():
-    def __init__(self, host, port, config_path):
+    def __init__(self, host, port, config_path, verbose=True):
         self._host = host
         self._port = port
         self._config_path = config_path
+        self._verbose = verbose
         self._control_blocks = None
         self._is_under_capacity = False
         self._service_status_count = 0
 
+    def _log(self, message):
+        if self._verbose:
+            print(message)
+
     def read_point(self, point, conn):
-        print('Read point: {}'.format(point['path']))
+        self._log('Read point: {}'.format(point['path']))
         loader = get_mms_loader(point['type'])
         if loader is None:
             print('Cannot find corresponding converter for {}'.format(
                 point['type']))
-            return
+            return None, None
 
         res = iec61850.IedConnection_readObject_no_gil(
             conn, point['path'], point['fc'])
@@ -28,12 +84,16 @@ class DummyClient():
             return None, res
 
         mms_value, error = res
+        if error != iec61850.IED_ERROR_OK:
+            print('Read {} failed, error: {}'.format(point['path'], error))
+            return None, error
+
         value = loader(mms_value)
         iec61850.MmsValue_delete(mms_value)
         return value, error
 
     def read_data_set(self, data_set_path, conn):
-        print('Read data set: {}'.format(data_set_path))
+        self._log('Read data set: {}'.format(data_set_path))
         res = iec61850.IedConnection_readDataSetValues_no_gil(
             conn, data_set_path, None)
         if res is None or isinstance(res, int):
@@ -41,8 +101,12 @@ class DummyClient():
             return None, res
 
         data_set, error = res
+        if error != iec61850.IED_ERROR_OK:
+            print('Read data set {} failed, error: {}'.format(data_set_path, error))
+            return None, error
+
         values = iec61850.ClientDataSet_getValues(data_set)
-        if iec61850.MmsValue_getType(values) == iec61850.MMS_ARRAY:
+        if self._verbose and iec61850.MmsValue_getType(values) == iec61850.MMS_ARRAY:
             for i in range(iec61850.MmsValue_getArraySize(values)):
                 print('[{}] {}'.format(
                     i,
@@ -66,25 +130,39 @@ class DummyClient():
         iec61850.ControlObjectClient_setOrigin(control_blocks['start_service'], None, 3)
         iec61850.ControlObjectClient_setOrigin(control_blocks['stop_service'], None, 3)
         self._control_blocks = control_blocks
+        # operate only reads ctlVal, the same values are used for every command
+        self._control_values = {
+            True: iec61850.MmsValue_newBoolean(True),
+            False: iec61850.MmsValue_newBoolean(False),
+        }
+
+    def destroy_control_blocks(self):
+        if self._control_blocks is None:
+            return
+        for control_block in self._control_blocks.values():
+            iec61850.ControlObjectClient_destroy(control_block)
+        for control_value in self._control_values.values():
+            iec61850.MmsValue_delete(control_value)
+        self._control_blocks = None
 
     def perfom_control(self):
         print('Perform control')
         if self._control_blocks is None:
             return
 
-        under_capacity = iec61850.MmsValue_newBoolean(self._is_under_capacity)
-        iec61850.ControlObjectClient_operate_no_gil(self._control_blocks['capacity'], under_capacity, 0)
+        iec61850.ControlObjectClient_operate_no_gil(
+            self._control_blocks['capacity'], self._control_values[self._is_under_capacity], 0)
         print('Update capacity')
 
         if self._service_status_count == 0:
             print('start execution')
             iec61850.ControlObjectClient_operate_no_gil(
-                self._control_blocks['start_service'], iec61850.MmsValue_newBoolean(True), 0)
+                self._control_blocks['start_service'], self._control_values[True], 0)
 
         if self._service_status_count == 6:
             print('stop execution')
             iec61850.ControlObjectClient_operate_no_gil(
-                self._control_blocks['stop_service'], iec61850.MmsValue_newBoolean(True), 0)
+                self._control_blocks['stop_service'], self._control_values[True], 0)
 
         self._is_under_capacity = not self._is_under_capacity
         self._service_status_count = (self._service_status_count + 1) % 10
@@ -182,6 +260,7 @@ class DummyClient():
 
             time.sleep(10)
 
+        self.destroy_control_blocks()
         error = iec61850.IedConnection_release(conn)
         if error != iec61850.IED_ERROR_OK:
             print('Release returned error: {}'.format(error))
@@ -192,6 +271,227 @@ class DummyClient():
 
         iec61850.IedConnection_destroy(conn)
 
+    def plan_polling(self, conn, points):
+        """Group points by logical node and FC, each group is read as one structure."""
+        groups = {}
+        for point in points:
+            loader = get_mms_loader(point['type'])
+            if loader is None:
+                print('Cannot find corresponding converter for {}'.format(point['type']))
+                continue
+            ln_reference, _, child = point['path'].partition('.')
+            groups.setdefault((ln_reference, point['fc']), []).append(
+                (point['path'], child.replace('.', '$'), loader))
+
+        plan = []
+        for (ln_reference, fc), members in groups.items():
+            # the specification locates the points in the structure read from the server,
+            # only the element indexes are kept
+            spec, error = iec61850.IedConnection_getVariableSpecification(conn, ln_reference, fc)
+            if error != iec61850.IED_ERROR_OK:
+                print('Get variable specification of {} failed, error: {}'.format(
+                    ln_reference, error))
+                continue
+            points = []
+            for path, child, loader in members:
+                indexes = element_indexes(spec, child)
+                if indexes is None:
+                    print('Cannot find {} in {}'.format(child, ln_reference))
+                    continue
+                points.append((path, indexes, loader))
+            iec61850.MmsVariableSpecification_destroy(spec)
+            plan.append({'reference': ln_reference, 'fc': fc, 'points': points})
+        return plan
+
+    def poll_group(self, conn, group, values):
+        res = iec61850.IedConnection_readObject_no_gil(conn, group['reference'], group['fc'])
+        if res is None or isinstance(res, int):
+            print('Read {} failed, error: {}'.format(group['reference'], res))
+            return False
+        mms_value, error = res
+        if error != iec61850.IED_ERROR_OK:
+            print('Read {} failed, error: {}'.format(group['reference'], error))
+            return False
+
+        for path, indexes, loader in group['points']:
+            child_value = mms_value
+            for index in indexes:
+                child_value = child_value and iec61850.MmsValue_getElement(child_value, index)
+            values[path] = loader(child_value) if child_value else None
+        iec61850.MmsValue_delete(mms_value)
+        return True
+
+    def run_polling(self, pool_size, period):
+        """Poll every point of the model per period with one read per logical node and FC."""
+        pool = [conn for conn in (self._connect() for _ in range(pool_size)) if conn is not None]
+        if not pool:
+            return
+
+        model = load_model(self._config_path)
+        plan = self.plan_polling(pool[0], model['points'])
+        print('Poll {} points with {} reads over {} connections'.format(
+            sum(len(group['points']) for group in plan), len(plan), len(pool)))
+
+        def poll(conn, groups, values, failures):
+            for group in groups:
+                if not self.poll_group(conn, group, values):
+                    failures.append(group['reference'])
+
+        sweep = 0
+        while True:
+            started_at = time.monotonic()
+            values = {}
+            failures = []
+            threads = [
+                threading.Thread(target=poll, args=(conn, plan[i::len(pool)], values, failures))
+                for i, conn in enumerate(pool)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started_at
+
+            print(json.dumps({
+                'sweep': sweep,
+                'seconds': elapsed,
+                'round_trips': len(plan),
+                'points': len(values),
+                'failed_reads': failures,
+            }))
+            sweep += 1
+            time.sleep(max(0, period - elapsed))
+
+    def _connect(self):
+        conn = iec61850.IedConnection_create()
+        error = iec61850.IedConnection_connect(conn, self._host, self._port)
+        if error != iec61850.IED_ERROR_OK:
+            print('Failed to connect to {}:{}'.format(self._host, self._port))
+            iec61850.IedConnection_destroy(conn)
+            return None
+        return conn
+
+    def _operate(self, control, conn, control_clients, i):
+        control_client = control_clients.get(control['path'])
+        if control_client is None:
+            control_client = iec61850.ControlObjectClient_create(control['path'], conn)
+            iec61850.ControlObjectClient_setOrigin(control_client, None, 3)
+            control_clients[control['path']] = control_client
+        ctl_val = CONTROL_VALUES[control['cdc']](i)
+        success = iec61850.ControlObjectClient_operate_no_gil(control_client, ctl_val, 0)
+        iec61850.MmsValue_delete(ctl_val)
+        return success
+
+    def _run_load_connection(self, model, mix, interval, deadline, results):
+        """Issue operations of the mix every interval seconds on one connection."""
+        conn = self._connect()
+        if conn is None:
+            with results['lock']:
+                results['failed_connections'] += 1
+            return
+
+        latencies = {operation: [] for operation in OPERATIONS}
+        errors = {operation: 0 for operation in OPERATIONS}
+        control_clients = {}
+        operations, weights = zip(*mix.items())
+        next_at = time.monotonic()
+        i = 0
+        try:
+            while next_at < deadline:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                operation = random.choices(operations, weights)[0]
+
+                started_at = time.monotonic()
+                try:
+                    if operation == 'read_point':
+                        _, error = self.read_point(random.choice(model['points']), conn)
+                        ok = error == iec61850.IED_ERROR_OK
+                    elif operation == 'read_data_set':
+                        _, error = self.read_data_set(random.choice(model['data_sets']), conn)
+                        ok = error == iec61850.IED_ERROR_OK
+                    else:
+                        ok = self._operate(
+                            random.choice(model['controls']), conn, control_clients, i)
+                except Exception as e:
+                    print('{} failed: {}'.format(operation, e))
+                    ok = False
+                elapsed = time.monotonic() - started_at
+
+                if ok:
+                    latencies[operation].append(elapsed)
+                else:
+                    errors[operation] += 1
+                i += 1
+                # a fixed schedule, operations delayed by a slow one are issued back to back
+                next_at += interval
+        finally:
+            for control_client in control_clients.values():
+                iec61850.ControlObjectClient_destroy(control_client)
+            iec61850.IedConnection_close(conn)
+            iec61850.IedConnection_destroy(conn)
+
+        with results['lock']:
+            for operation in OPERATIONS:
+                results['latencies'][operation].extend(latencies[operation])
+                results['errors'][operation] += errors[operation]
+
+    def run_load(self, connections, rate, mix, duration):
+        """Run connections concurrently at a total rate (operations per second) for duration."""
+        model = load_model(self._config_path)
+        model['controls'] = [
+            control for control in model['controls'] if control['cdc'] in CONTROL_VALUES]
+        # an operation without targets in the model cannot be issued
+        mix = {operation: weight for operation, weight in mix.items()
+               if weight > 0 and model[OPERATION_TARGETS[operation]]}
+        if not mix:
+            raise ValueError('No operation of the mix has targets in {}'.format(self._config_path))
+
+        results = {
+            'lock': threading.Lock(),
+            'failed_connections': 0,
+            'latencies': {operation: [] for operation in OPERATIONS},
+            'errors': {operation: 0 for operation in OPERATIONS},
+        }
+        interval = connections / rate
+        started_at = time.monotonic()
+        deadline = started_at + duration
+        threads = [
+            threading.Thread(target=self._run_load_connection,
+                             args=(model, mix, interval, deadline, results))
+            for _ in range(connections)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started_at
+
+        return {
+            'connections': connections,
+            'failed_connections': results['failed_connections'],
+            'target_rate': rate,
+            'duration': elapsed,
+            'throughput': sum(map(len, results['latencies'].values())) / elapsed,
+            'operations': {
+                operation: summarize_latencies(
+                    results['latencies'][operation], results['errors'][operation], elapsed)
+                for operation in mix
+            },
+        }
+
+
+def _parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        operation, _, weight = item.partition('=')
+        if operation not in OPERATIONS:
+            raise argparse.ArgumentTypeError('Unknown operation {}, expected one of {}'.format(
+                operation, OPERATIONS))
+        mix[operation] = float(weight)
+    return mix
+
 
 def _parse_args():
     parser = argparse.ArgumentParser()
@@ -203,14 +503,48 @@ def _parse_args():
     parser.add_argument(
         '--config-path', default='../config/points.json',
         help='path to the config file, default ../config/points.json')
+    parser.add_argument(
+        '--pool-size', default=0, type=int,
+        help='poll all points per period with one read per logical node and FC, '
+             'spread over this many connections')
+    parser.add_argument(
+        '--period', default=10, type=float, help='seconds between polling sweeps, default 10')
+    parser.add_argument(
+        '--connections', default=0, type=int,
+        help='run as a load generator with this many concurrent connections')
+    parser.add_argument(
+        '--rate', default=100, type=float,
+        help='operations per second over all connections, default 100')
+    parser.add_argument(
+        '--mix', default='read_point=8,read_data_set=1,operate=1', type=_parse_mix,
+        help='weights of the operations, default read_point=8,read_data_set=1,operate=1')
+    parser.add_argument(
+        '--duration', default=60, type=float, help='seconds of load, default 60')
+    parser.add_argument(
+        '--report-path', help='write the JSON report to this file instead of stdout')
 
     return parser.parse_args()
 
 
 def main():
     args = _parse_args()
-    client = DummyClient(args.host, args.port, args.config_path)
-    client.run()
+    if args.pool_size > 0:
+        client = DummyClient(args.host, args.port, args.config_path, verbose=False)
+        client.run_polling(args.pool_size, args.period)
+        return 0
+    if args.connections <= 0:
+        client = DummyClient(args.host, args.port, args.config_path)
+        client.run()
+        return 0
+
+    client = DummyClient(args.host, args.port, args.config_path, verbose=False)
+    report = json.dumps(
+        client.run_load(args.connections, args.rate, args.mix, args.duration), indent=2)
+    if args.report_path:
+        with open(args.report_path, 'w') as f:
+            f.write(report + '\n')
+    else:
+        print(report)
     return 0
 
 
@@ -0,0 +1,6 @@
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of sorted values."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
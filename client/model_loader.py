@@ -1,5 +1,5 @@
-import json
 import iec61850
+from config_loader import iter_resolved_logical_devices
 
 
 MMS_LOADERS = {
@@ -10,6 +10,8 @@ MMS_LOADERS = {
     'uint32': iec61850.MmsValue_toUint32,
 }
 
+CONTROLLABLE_CDC = ['SPC', 'DPC', 'INC', 'ENC', 'BSC', 'ISC', 'APC', 'BAC']
+
 FC_MAPPING = {
     'MX': iec61850.IEC61850_FC_MX,
     'ST': iec61850.IEC61850_FC_ST,
@@ -24,6 +26,8 @@ def get_mms_loader(data_type):
 
 def load_data_object(model, parent_path, config):
     path = parent_path + '.' + config['name']
+    if config['cdc'] in CONTROLLABLE_CDC:
+        model['controls'].append({'path': path, 'cdc': config['cdc']})
     for da_config in config.get('data_attributes', []):
         name = da_config['name']
         fc = FC_MAPPING[da_config['fc']]
@@ -49,12 +53,10 @@ def load_logical_device(model, parent_path, config):
 
 
 def load_model(config_path):
-    with open(config_path) as f:
-        model_config = json.load(f)
-
-    model = {'points': [], 'data_sets': []}
-    path = model_config['name']
-    for ld_config in model_config.get('logical_devices', []):
-        load_logical_device(model, path, ld_config)
+    model = {'points': [], 'data_sets': [], 'controls': []}
+    header = {}
+    # logical devices are parsed and released one at a time
+    for ld_config in iter_resolved_logical_devices(config_path, header):
+        load_logical_device(model, header['name'], ld_config)
 
     return model
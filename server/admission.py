@@ -0,0 +1,167 @@
+import contextlib
+import heapq
+import itertools
+import re
+import threading
+import time
+
+from metrics import METRICS
+
+
+HIGH_PRIORITY = 0
+NORMAL_PRIORITY = 1
+
+GATE_CONFIG_DEFAULTS = {
+    'update_point_values': {'limit': 4, 'queue_size': 100, 'timeout': 5},
+    'add_logical_devices': {'limit': 1, 'queue_size': 2, 'timeout': 30},
+    'reset_logical_devices': {'limit': 1, 'queue_size': 2, 'timeout': 30},
+    'restart_ied_server': {'limit': 1, 'queue_size': 2, 'timeout': 30},
+    'get_point_values': {'limit': 2, 'queue_size': 10, 'timeout': 5},
+}
+
+# The gates below only apply to a call once a worker thread runs it. Calls waiting for a
+# worker are queued by the gRPC executor in arrival order, max_concurrent_rpcs bounds them.
+ADMISSION_CONFIG_DEFAULTS = {
+    'max_workers': 10,  # threads of the gRPC server for unary calls
+    # watch_control_commands streams hold a thread each for their whole life, they get their
+    # own threads and are refused beyond this
+    'max_subscribers': 4,
+    # the gRPC server answers RESOURCE_EXHAUSTED beyond this, None is unlimited
+    'max_concurrent_rpcs': 50,
+    # updates touching these points (control acknowledgements) jump ahead of bulk telemetry
+    'priority_points': [r'.*GGIO0[34]\.Ind1\.stVal'],
+    'gates': GATE_CONFIG_DEFAULTS,
+}
+
+
+def load_admission_config(config):
+    admission_config = dict(ADMISSION_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in admission_config:
+            raise ValueError('Unknown admission config: {}'.format(key))
+        admission_config[key] = value
+
+    for key in ['max_workers', 'max_subscribers']:
+        if type(admission_config[key]) is not int or admission_config[key] <= 0:
+            raise ValueError('Admission config {} must be a positive integer, got {!r}'.format(
+                key, admission_config[key]))
+    threads = admission_config['max_workers'] + admission_config['max_subscribers']
+    max_concurrent_rpcs = admission_config['max_concurrent_rpcs']
+    if max_concurrent_rpcs is not None and (
+            type(max_concurrent_rpcs) is not int or max_concurrent_rpcs < threads):
+        raise ValueError(
+            'Admission config max_concurrent_rpcs must be at least max_workers + '
+            'max_subscribers ({}), got {!r}'.format(threads, max_concurrent_rpcs))
+
+    gates = {}
+    for name, defaults in GATE_CONFIG_DEFAULTS.items():
+        gate = dict(defaults, **admission_config['gates'].get(name, {}))
+        for key, value in gate.items():
+            if key not in defaults:
+                raise ValueError('Unknown admission config of {}: {}'.format(name, key))
+            if not isinstance(value, (int, float)) or value <= 0:
+                raise ValueError('Admission config {} of {} must be positive, got {!r}'.format(
+                    key, name, value))
+        gates[name] = gate
+    unknown_gates = set(admission_config['gates']) - set(GATE_CONFIG_DEFAULTS)
+    if unknown_gates:
+        raise ValueError('Unknown admission gates: {}'.format(sorted(unknown_gates)))
+    admission_config['gates'] = gates
+    admission_config['priority_points'] = re.compile(
+        '|'.join('(?:{})'.format(pattern) for pattern in admission_config['priority_points'])
+        or '(?!)')
+
+    return admission_config
+
+
+class AdmissionGate():
+    """Admit `limit` concurrent calls and queue up to `queue_size` more, highest priority first.
+
+    The calls wait here on their worker threads, calls not yet given a worker are not seen.
+    """
+
+    def __init__(self, name, limit, queue_size, timeout):
+        self._name = name
+        self._limit = limit
+        self._queue_size = queue_size
+        self._timeout = timeout
+        self._condition = threading.Condition()
+        self._active = 0
+        self._waiting = []  # heap of (priority, sequence)
+        self._sequence = itertools.count()
+
+    def _shed(self):
+        METRICS.increase('rpc_shed.{}'.format(self._name))
+        return False
+
+    def acquire(self, priority=NORMAL_PRIORITY):
+        with self._condition:
+            if self._active < self._limit and not self._waiting:
+                self._active += 1
+                return True
+            if len(self._waiting) >= self._queue_size:
+                return self._shed()
+
+            ticket = (priority, next(self._sequence))
+            heapq.heappush(self._waiting, ticket)
+            METRICS.set('rpc_queued.{}'.format(self._name), len(self._waiting))
+            deadline = time.monotonic() + self._timeout
+            while self._active >= self._limit or self._waiting[0] != ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    METRICS.set('rpc_queued.{}'.format(self._name), len(self._waiting))
+                    self._condition.notify_all()
+                    return self._shed()
+                self._condition.wait(remaining)
+
+            heapq.heappop(self._waiting)
+            METRICS.set('rpc_queued.{}'.format(self._name), len(self._waiting))
+            self._active += 1
+            # let the next waiter check whether it is its turn
+            self._condition.notify_all()
+            return True
+
+    def release(self):
+        with self._condition:
+            self._active -= 1
+            self._condition.notify_all()
+
+
+class AdmissionController():
+    def __init__(self, config):
+        self._priority_points = config['priority_points']
+        self._gates = {
+            name: AdmissionGate(name, gate['limit'], gate['queue_size'], gate['timeout'])
+            for name, gate in config['gates'].items()
+        }
+        self._subscribers = threading.BoundedSemaphore(config['max_subscribers'])
+
+    def priority_of(self, values):
+        if any(self._priority_points.fullmatch(path) for path in values):
+            return HIGH_PRIORITY
+        return NORMAL_PRIORITY
+
+    @contextlib.contextmanager
+    def admit(self, name, priority=NORMAL_PRIORITY):
+        """Yield whether the call is admitted, the slot is released on exit."""
+        gate = self._gates[name]
+        admitted = gate.acquire(priority)
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                gate.release()
+
+    @contextlib.contextmanager
+    def admit_subscriber(self):
+        """Yield whether a streaming subscriber may hold one of the subscriber threads."""
+        admitted = self._subscribers.acquire(blocking=False)
+        if not admitted:
+            METRICS.increase('rpc_shed.watch_control_commands')
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._subscribers.release()
@@ -0,0 +1,133 @@
+import json
+import re
+import threading
+import time
+
+import grpc
+import taipower_ancillary_pb2
+import taipower_ancillary_pb2_grpc
+
+from control_stream import NOT_SENT, ControlStreamClient
+from metrics import METRICS
+
+
+BACKEND_CONFIG_DEFAULTS = {
+    'prefix': None,  # logical device name prefix, e.g. ASG0001
+    'pattern': None,  # regular expression matching the whole logical device name
+    'address': None,
+    'max_concurrency': 10,
+    'timeout': 2,  # seconds
+}
+
+
+def load_backend_config(config):
+    backend_config = dict(BACKEND_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in backend_config:
+            raise ValueError('Unknown backend config: {}'.format(key))
+        backend_config[key] = value
+
+    if not isinstance(backend_config['address'], str):
+        raise ValueError('Backend config address is required, got {!r}'.format(config))
+    if (backend_config['prefix'] is None) == (backend_config['pattern'] is None):
+        raise ValueError(
+            'Backend config needs either a prefix or a pattern, got {!r}'.format(config))
+    if backend_config['pattern'] is not None:
+        backend_config['pattern'] = re.compile(backend_config['pattern'])
+    if type(backend_config['max_concurrency']) is not int or backend_config['max_concurrency'] <= 0:
+        raise ValueError(
+            'Backend config max_concurrency must be a positive integer, got {!r}'.format(
+                backend_config['max_concurrency']))
+    if not isinstance(backend_config['timeout'], (int, float)) or backend_config['timeout'] <= 0:
+        raise ValueError('Backend config timeout must be positive, got {!r}'.format(
+            backend_config['timeout']))
+
+    return backend_config
+
+
+class Backend():
+    def __init__(self, address, max_concurrency, timeout):
+        self.address = address
+        self._timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._channel = grpc.insecure_channel(address)
+        self._stub = taipower_ancillary_pb2_grpc.AncillaryOutputsStub(self._channel)
+        self._control_stream = ControlStreamClient(self._channel, self._stub, timeout=timeout)
+
+    def start(self):
+        self._control_stream.start()
+
+    def stop(self):
+        self._control_stream.stop()
+        self._channel.close()
+
+    def forward(self, message, reference, value):
+        # waiting for a slot and for the result share one timeout
+        deadline = time.monotonic() + self._timeout
+        if not self._slots.acquire(timeout=self._timeout):
+            print(f'Backend {self.address} is busy, reject control command: {reference}')
+            METRICS.increase('backend_busy_rejections')
+            return False
+
+        try:
+            result = self._control_stream.send(
+                message, timeout=max(deadline - time.monotonic(), 0))
+            if result is not NOT_SENT and isinstance(result, str):
+                # the command may have been delivered, sending it again could operate twice
+                print(f'No result of control command: {reference} ({result}), reject it')
+                METRICS.increase('control_stream_rejections')
+                return False
+            if result is not NOT_SENT:
+                print(f'Handled control command: {reference}, accepted: {result.accepted}, '
+                      f'reason: {result.reason}')
+                return result.accepted
+
+            # the control stream is not open or not implemented, use the unary RPC
+            self._stub.update_point_values(
+                taipower_ancillary_pb2.UpdatePointValuesRequest(
+                    values=json.dumps({reference: value})),
+                timeout=max(deadline - time.monotonic(), 0.001))
+            # backends reply an empty Response, the command is accepted unless the call fails
+            print(f'Handled control command: {reference}')
+            return True
+        except Exception as e:
+            print(f'Exception: {e}')
+            return False
+        finally:
+            self._slots.release()
+
+
+class BackendRouter():
+    def __init__(self, configs, default_address):
+        self._routes = []
+        backends = {}
+        for config in map(load_backend_config, configs):
+            if config['address'] not in backends:
+                backends[config['address']] = Backend(
+                    config['address'], config['max_concurrency'], config['timeout'])
+            self._routes.append((config['prefix'], config['pattern'], backends[config['address']]))
+
+        if default_address not in backends:
+            defaults = BACKEND_CONFIG_DEFAULTS
+            backends[default_address] = Backend(
+                default_address, defaults['max_concurrency'], defaults['timeout'])
+        self._default = backends[default_address]
+        self._backends = list(backends.values())
+
+    def resolve(self, do_path):
+        ld_name = do_path.split('/', 1)[0]
+        for prefix, pattern, backend in self._routes:
+            if prefix is not None and ld_name.startswith(prefix):
+                return backend
+            if pattern is not None and pattern.fullmatch(ld_name):
+                return backend
+        return self._default
+
+    def start(self):
+        for backend in self._backends:
+            print('Connect to backend {}'.format(backend.address))
+            backend.start()
+
+    def stop(self):
+        for backend in self._backends:
+            backend.stop()
@@ -0,0 +1,148 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+
+
+RELOAD_CONFIG_DEFAULTS = {
+    'debounce': 1.0,  # seconds without further changes before the file is reloaded
+    'poll_interval': 2.0,  # seconds, when inotify is not available
+    'inotify': True,
+}
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+# struct inotify_event: wd, mask, cookie and len, followed by len bytes of name
+INOTIFY_EVENT = struct.Struct('iIII')
+
+
+def load_reload_config(config):
+    reload_config = dict(RELOAD_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in reload_config:
+            raise ValueError('Unknown reload config: {}'.format(key))
+        reload_config[key] = value
+
+    for key in ['debounce', 'poll_interval']:
+        if not isinstance(reload_config[key], (int, float)) or reload_config[key] <= 0:
+            raise ValueError('Reload config {} must be positive, got {!r}'.format(
+                key, reload_config[key]))
+
+    return reload_config
+
+
+class Inotify():
+    """Names of the files written, moved or created in a directory, through the libc calls."""
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, 'inotify_init1: {}'.format(os.strerror(errno)))
+        # the directory is watched, editors and volume mounts often replace the file
+        wd = libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, 'inotify_add_watch {}: {}'.format(directory, os.strerror(errno)))
+
+    def read(self, timeout):
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        data = os.read(self._fd, 65536)
+        names = []
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            names.append(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self._fd)
+
+
+class ConfigWatcher():
+    """Call on_change once a file has stopped changing for the debounce period."""
+
+    def __init__(self, path, on_change, config):
+        self._path = os.path.abspath(path)
+        self._on_change = on_change
+        self._config = config
+        self._stopped = threading.Event()
+        self._thread = None
+        self._own_signature = None
+
+    def _signature(self):
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    def ignore_current(self):
+        """The file was written by the proxy itself, it is not reloaded."""
+        self._own_signature = self._signature()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _open_inotify(self):
+        if not self._config['inotify']:
+            return None
+        try:
+            return Inotify(os.path.dirname(self._path))
+        except (OSError, AttributeError) as e:
+            print('Inotify is not available ({}), poll {} instead'.format(e, self._path))
+            return None
+
+    def _run(self):
+        inotify = self._open_inotify()
+        print('Watch {} with {}'.format(self._path, 'inotify' if inotify else 'polling'))
+        name = os.path.basename(self._path)
+        debounce = self._config['debounce']
+        signature = self._signature()
+        changed_at = None
+        while not self._stopped.is_set():
+            if inotify is not None:
+                if name in inotify.read(debounce if changed_at is not None else 1):
+                    changed_at = time.monotonic()
+            else:
+                self._stopped.wait(min(debounce, self._config['poll_interval'])
+                                   if changed_at is not None else self._config['poll_interval'])
+                current = self._signature()
+                if current != signature:
+                    signature = current
+                    changed_at = time.monotonic()
+
+            if changed_at is None or time.monotonic() - changed_at < debounce:
+                continue
+            changed_at = None
+            current = self._signature()
+            if current is None or current == self._own_signature:
+                continue
+            try:
+                self._on_change()
+            except Exception as e:
+                print('Exception: {}'.format(e))
+
+        if inotify is not None:
+            inotify.close()
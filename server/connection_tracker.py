@@ -0,0 +1,41 @@
+import threading
+import time
+
+from metrics import METRICS
+
+
+class ConnectionTracker():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._connections = {}
+
+    def handle_connection(self, peer_address, connected):
+        print('MMS client {} {}'.format(peer_address, 'connected' if connected else 'disconnected'))
+        with self._lock:
+            if connected:
+                self._connections[peer_address] = {
+                    'peer_address': peer_address,
+                    'connected_at': time.time(),
+                    'control_count': 0,
+                    'last_control_at': None,
+                    'controls': {},  # number of control operations by data object path
+                }
+                METRICS.increase('mms_connections_total')
+            else:
+                self._connections.pop(peer_address, None)
+            METRICS.set('mms_connections', len(self._connections))
+
+    def record_control(self, peer_address, do_path):
+        METRICS.increase('mms_control_operations')
+        with self._lock:
+            connection = self._connections.get(peer_address)
+            if connection is None:
+                return
+            connection['control_count'] += 1
+            connection['last_control_at'] = time.time()
+            connection['controls'][do_path] = connection['controls'].get(do_path, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            return [dict(connection, controls=dict(connection['controls']))
+                    for connection in self._connections.values()]
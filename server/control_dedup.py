@@ -0,0 +1,100 @@
+import collections
+import json
+import threading
+import time
+
+from metrics import METRICS
+
+
+DEDUP_CONFIG_DEFAULTS = {
+    # seconds a forwarded command is remembered, ctlNum wraps after 256 commands of a client
+    'window': 2.0,
+    'max_entries': 10000,
+}
+
+
+def load_dedup_config(config):
+    dedup_config = dict(DEDUP_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in dedup_config:
+            raise ValueError('Unknown control dedup config: {}'.format(key))
+        dedup_config[key] = value
+
+    for key in ['window', 'max_entries']:
+        if not isinstance(dedup_config[key], (int, float)) or dedup_config[key] <= 0:
+            raise ValueError('Control dedup config {} must be positive, got {!r}'.format(
+                key, dedup_config[key]))
+
+    return dedup_config
+
+
+def control_key(command, originator_identifier):
+    """(DO path, originator, ctlNum, value, test) of a command, None when ctlNum is unknown."""
+    if 'control_number' not in command:
+        return None
+    value = command['value']
+    if not isinstance(value, (bool, int, float, str)):
+        # structured values are lists or dicts
+        value = json.dumps(value, sort_keys=True)
+    return (command['path'], command['originator_category'], originator_identifier,
+            command['control_number'], value, command['test'])
+
+
+class _Entry():
+    __slots__ = ('done', 'result', 'expires_at')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.expires_at = None  # set once the result is known
+
+
+class ControlDeduplicator():
+    """Forward a command once, repeats of it within the window get the same result.
+
+    Only accepted commands are remembered, a repeat of a failed one is forwarded again.
+    """
+
+    def __init__(self, config):
+        self._window = config['window']
+        self._max_entries = config['max_entries']
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+
+    def _expire(self, now):
+        # oldest first, a pending entry stops the scan until its result is known
+        while self._entries:
+            entry = next(iter(self._entries.values()))
+            if entry.expires_at is None or entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+
+    def run(self, key, forward):
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(key)
+            pending = entry is None
+            if pending:
+                entry = self._entries[key] = _Entry()
+                if len(self._entries) > self._max_entries:
+                    self._entries.popitem(last=False)
+                    METRICS.increase('control_dedup_evictions')
+
+        if not pending:
+            # a repeat received while the first one is forwarded waits for its result
+            entry.done.wait()
+            METRICS.increase('control_dedup_hits')
+            return entry.result
+
+        try:
+            entry.result = forward()
+        finally:
+            entry.expires_at = time.monotonic() + self._window
+            if not entry.result:
+                # busy backends and errors are transient, the next retry must reach the backend
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+            # repeats received meanwhile get this result, failed or not
+            entry.done.set()
+        return entry.result
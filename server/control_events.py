@@ -0,0 +1,85 @@
+import collections
+import queue
+import threading
+
+from metrics import METRICS
+
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+DISCONNECT = 'disconnect'
+
+
+class Subscription():
+    def __init__(self, buffer_size, policy):
+        self._buffer_size = buffer_size
+        self._policy = policy
+        self._events = collections.deque()
+        self._condition = threading.Condition()
+        self.closed = False
+        self.dropped = 0
+
+    def offer(self, event):
+        with self._condition:
+            if self.closed:
+                return
+            if len(self._events) >= self._buffer_size:
+                METRICS.increase('control_events_dropped')
+                if self._policy == DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self._policy == DISCONNECT:
+                    self.closed = True
+                    self._condition.notify_all()
+                    return
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append(event)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Return the next event, None on timeout or once the subscription is closed."""
+        with self._condition:
+            if not self._events and not self.closed:
+                self._condition.wait(timeout)
+            if self.closed or not self._events:
+                return None
+            return self._events.popleft()
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class ControlEventBroker():
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def publish(self, event):
+        self._queue.put(event)
+
+    def subscribe(self, buffer_size, policy):
+        subscription = Subscription(buffer_size, policy)
+        with self._lock:
+            self._subscriptions.add(subscription)
+            METRICS.set('control_subscribers', len(self._subscriptions))
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            self._subscriptions.discard(subscription)
+            METRICS.set('control_subscribers', len(self._subscriptions))
+
+    def _dispatch(self):
+        while True:
+            event = self._queue.get()
+            with self._lock:
+                subscriptions = list(self._subscriptions)
+            for subscription in subscriptions:
+                subscription.offer(event)
@@ -0,0 +1,134 @@
+import queue
+import threading
+import time
+
+import grpc
+
+from metrics import METRICS
+
+
+# Results of send when no ControlResult was received
+NOT_SENT = 'not_sent'  # no stream was open, the command never reached the backend
+TIMED_OUT = 'timed_out'  # sent, the backend may have received it
+DISCONNECTED = 'disconnected'  # sent, the stream broke before the result came back
+
+
+class ControlStreamClient():
+    """Keep one control_stream call open to the backend and correlate results by command id."""
+
+    def __init__(self, channel, stub, timeout=2, reconnect_interval=1, max_reconnect_interval=30):
+        self._channel = channel
+        self._stub = stub
+        self._timeout = timeout
+        self._reconnect_interval = reconnect_interval
+        self._max_reconnect_interval = max_reconnect_interval
+        self._supported = True  # False once the backend answered UNIMPLEMENTED
+        self._lock = threading.Lock()
+        self._pending = {}  # command id -> [event, result]
+        self._requests = None  # queue of the current call, None while disconnected
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @property
+    def connected(self):
+        return self._requests is not None
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._disconnect()
+
+    def send(self, message, timeout=None):
+        """Send a ControlCommand and wait for its ControlResult.
+
+        NOT_SENT, TIMED_OUT or DISCONNECTED when there is no result, only a NOT_SENT command
+        may be sent again by other means. Commands are NOT_SENT while reconnecting and when
+        the backend does not implement control_stream.
+        """
+        pending = [threading.Event(), None]
+        with self._lock:
+            if self._requests is None:
+                return NOT_SENT
+            self._pending[message.id] = pending
+            self._requests.put(message)
+
+        if not pending[0].wait(self._timeout if timeout is None else timeout):
+            print('Control command {} timed out on the control stream'.format(message.id))
+            METRICS.increase('control_stream_timeouts')
+        with self._lock:
+            self._pending.pop(message.id, None)
+        return TIMED_OUT if pending[1] is None else pending[1]
+
+    def _iterate_requests(self, requests):
+        while True:
+            message = requests.get()
+            if message is None:
+                return
+            yield message
+
+    def _disconnect(self, result=DISCONNECTED):
+        with self._lock:
+            if self._requests is not None:
+                # end the request iterator of the broken call
+                self._requests.put(None)
+                self._requests = None
+            # the callers stop waiting, the commands may have reached the backend already
+            for pending in self._pending.values():
+                pending[1] = result
+                pending[0].set()
+            self._pending.clear()
+
+    def _wait_for_channel(self, timeout):
+        ready = grpc.channel_ready_future(self._channel)
+        try:
+            ready.result(timeout=timeout)
+            return True
+        except (grpc.FutureTimeoutError, grpc.FutureCancelledError):
+            ready.cancel()
+            return False
+
+    def _stream(self):
+        """Run one control_stream call until it ends, False when the backend lacks it."""
+        requests = queue.Queue()
+        with self._lock:
+            self._requests = requests
+        try:
+            print('Open control stream')
+            for result in self._stub.control_stream(self._iterate_requests(requests)):
+                with self._lock:
+                    pending = self._pending.get(result.id)
+                if pending is not None:
+                    pending[1] = result
+                    pending[0].set()
+        except grpc.RpcError as e:
+            if e.code() == grpc.StatusCode.UNIMPLEMENTED:
+                # no handler ran, the queued commands can go through update_point_values
+                if self._supported:
+                    print('Backend has no control stream, use update_point_values')
+                self._disconnect(NOT_SENT)
+                return False
+            print('Control stream broken: {}'.format(e))
+        self._disconnect()
+        return True
+
+    def _run(self):
+        interval = self._reconnect_interval
+        while not self._stopped.is_set():
+            # send returns NOT_SENT until the channel is connected and the call is opened
+            if not self._wait_for_channel(interval):
+                interval = min(interval * 2, self._max_reconnect_interval)
+                continue
+
+            opened_at = time.monotonic()
+            self._supported = self._stream()
+            METRICS.increase('control_stream_reconnects')
+            if not self._supported:
+                # look again now and then, the backend may be upgraded
+                interval = self._max_reconnect_interval
+            elif time.monotonic() - opened_at >= self._max_reconnect_interval:
+                # the call was up for a while, a new break is not a failing backend
+                interval = self._reconnect_interval
+            self._stopped.wait(interval)
+            interval = min(interval * 2, self._max_reconnect_interval)
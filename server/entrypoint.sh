@@ -1,2 +1,6 @@
 #!/bin/bash
+# one ProxyServer per shard when a shard config is given
+if [ -f config/shards.json ]; then
+    exec python3 -u supervisor.py --config-path config/shards.json
+fi
 python3 -u proxy_server.py
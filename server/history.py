@@ -0,0 +1,188 @@
+import struct
+import threading
+import time
+from array import array
+
+
+TYPECODES = {
+    'int32': 'i',
+    'int64': 'q',
+    'uint32': 'I',
+    'float': 'f',
+    'boolean': 'B',
+}
+
+# Spill record: path length, value typecode, number of entries, then the path,
+# the timestamps (float64) and the values (typed) of the entries
+SPILL_HEADER = struct.Struct('<HcI')
+
+HISTORY_CONFIG_DEFAULTS = {
+    'capacity': 1440,
+    'points': [],
+    'spill_path': None,
+    'spill_interval': 60,  # seconds
+}
+
+
+def load_history_config(config):
+    history_config = dict(HISTORY_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in history_config:
+            raise ValueError('Unknown history config: {}'.format(key))
+        history_config[key] = value
+
+    for key in ['capacity', 'spill_interval']:
+        if type(history_config[key]) is not int or history_config[key] <= 0:
+            raise ValueError('History config {} must be a positive integer, got {!r}'.format(
+                key, history_config[key]))
+    if not all(isinstance(path, str) for path in history_config['points']):
+        raise ValueError('History config points must be a list of data attribute paths')
+
+    return history_config
+
+
+class RingBuffer():
+    def __init__(self, capacity, typecode):
+        self._capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._values = array(typecode, bytes(array(typecode).itemsize * capacity))
+        self._next = 0
+        self._size = 0
+        self._unspilled = 0
+
+    @property
+    def nbytes(self):
+        return (self._timestamps.itemsize + self._values.itemsize) * self._capacity
+
+    def append(self, timestamp, value):
+        self._timestamps[self._next] = timestamp
+        self._values[self._next] = value
+        self._next = (self._next + 1) % self._capacity
+        self._size = min(self._size + 1, self._capacity)
+        self._unspilled = min(self._unspilled + 1, self._capacity)
+
+    def _slots(self, count):
+        # physical slots of the latest `count` entries, oldest first
+        first = (self._next - count) % self._capacity
+        return [(first + i) % self._capacity for i in range(count)]
+
+    def _bisect(self, timestamp):
+        # index (oldest first) of the first entry not older than timestamp
+        first = (self._next - self._size) % self._capacity
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamps[(first + middle) % self._capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def query(self, start, end):
+        first = (self._next - self._size) % self._capacity
+        begin, stop = self._bisect(start), self._bisect(end)
+        slots = [(first + i) % self._capacity for i in range(begin, stop)]
+        return [self._timestamps[i] for i in slots], [self._values[i] for i in slots]
+
+    def take_unspilled(self):
+        slots = self._slots(self._unspilled)
+        self._unspilled = 0
+        timestamps = array('d', (self._timestamps[i] for i in slots))
+        values = array(self._values.typecode, (self._values[i] for i in slots))
+        return timestamps, values
+
+
+class HistoryStore():
+    def __init__(self, config, data_types):
+        self._lock = threading.Lock()
+        self._capacity = config['capacity']
+        self._points = config['points']
+        self._spill_path = config['spill_path']
+        self._spill_interval = config['spill_interval']
+        self._stopped = threading.Event()
+        self._spill_thread = None
+
+        self._buffers = {}
+        self.update_data_types(data_types)
+
+    def update_data_types(self, data_types):
+        """Follow the model: buffer the points it has, drop the ones it no longer has."""
+        with self._lock:
+            for path in self._points:
+                data_type = data_types.get(path)
+                if data_type is None:
+                    if self._buffers.pop(path, None) is None:
+                        print('History point {} is not in the model'.format(path))
+                elif path not in self._buffers or self._buffers[path][0] != data_type:
+                    self._buffers[path] = (
+                        data_type, RingBuffer(self._capacity, TYPECODES[data_type]))
+
+            print('History of {} points, {} bytes'.format(
+                len(self._buffers), sum(buffer.nbytes for _, buffer in self._buffers.values())))
+
+    def record(self, values, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            for path, value in values.items():
+                entry = self._buffers.get(path)
+                if entry is not None:
+                    entry[1].append(timestamp, value)
+
+    def query(self, path, start, end):
+        with self._lock:
+            data_type, buffer = self._buffers[path]
+            timestamps, values = buffer.query(start, end)
+        return data_type, timestamps, values
+
+    def spill(self):
+        with self._lock:
+            records = [(path, buffer.take_unspilled())
+                       for path, (_, buffer) in self._buffers.items()]
+
+        # append-only, readers can rely on records never being rewritten
+        with open(self._spill_path, 'ab') as f:
+            for path, (timestamps, values) in records:
+                if not timestamps:
+                    continue
+                encoded_path = path.encode()
+                f.write(SPILL_HEADER.pack(
+                    len(encoded_path), values.typecode.encode(), len(timestamps)))
+                f.write(encoded_path)
+                f.write(timestamps.tobytes())
+                f.write(values.tobytes())
+
+    def _run_spill(self):
+        while not self._stopped.wait(self._spill_interval):
+            try:
+                self.spill()
+            except OSError as e:
+                print('Spill history to {} failed: {}'.format(self._spill_path, e))
+
+    def start(self):
+        if self._spill_path is None:
+            return
+        print('Spill history to {} every {} seconds'.format(self._spill_path, self._spill_interval))
+        self._spill_thread = threading.Thread(target=self._run_spill, daemon=True)
+        self._spill_thread.start()
+
+    def stop(self):
+        if self._spill_thread is None:
+            return
+        self._stopped.set()
+        self._spill_thread.join()
+        self.spill()
+
+
+def read_spill_file(path):
+    with open(path, 'rb') as f:
+        while True:
+            header = f.read(SPILL_HEADER.size)
+            if len(header) < SPILL_HEADER.size:
+                return
+            path_size, typecode, count = SPILL_HEADER.unpack(header)
+            da_path = f.read(path_size).decode()
+            timestamps = array('d')
+            timestamps.frombytes(f.read(8 * count))
+            values = array(typecode.decode())
+            values.frombytes(f.read(values.itemsize * count))
+            yield da_path, timestamps, values
@@ -0,0 +1,40 @@
+import threading
+import time
+
+
+class Metrics():
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._observations = {}
+
+    def increase(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        with self._lock:
+            observation = self._observations.setdefault(
+                name, {'count': 0, 'sum': 0, 'min': value, 'max': value, 'last': value})
+            observation['count'] += 1
+            observation['sum'] += value
+            observation['min'] = min(observation['min'], value)
+            observation['max'] = max(observation['max'], value)
+            observation['last'] = value
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'timestamp': time.time(),
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'observations': {name: dict(o) for name, o in self._observations.items()},
+            }
+
+
+METRICS = Metrics()
@@ -1,5 +1,6 @@
-import json
 import iec61850
+import sys
+from config_loader import expand_logical_devices, resolve_logical_device
 from functools import reduce
 
 
@@ -47,7 +48,9 @@ OPTION_MAP = {
     },
     'controlOptions': {
         'MODEL_DIRECT_NORMAL': iec61850.CDC_CTL_MODEL_DIRECT_NORMAL,
-    }
+    },
+    # none is supported yet, an empty list is the only valid value
+    'wpOptions': {},
 }
 
 CDC_CREATORS = dict(map(
@@ -66,6 +69,61 @@ CDC_CREATORS = dict(map(
 
 CONTROLLABLE_CDC = ['SPC', 'DPC', 'INC', 'ENC', 'BSC', 'ISC', 'APC', 'BAC']
 
+
+def read_mms_value(mms_value):
+    mms_value_type = iec61850.MmsValue_getTypeString(mms_value)
+    if mms_value_type == 'boolean':
+        return iec61850.MmsValue_getBoolean(mms_value)
+    elif mms_value_type == 'integer':
+        return iec61850.MmsValue_toInt32(mms_value)
+    elif mms_value_type == 'float':
+        return iec61850.MmsValue_toFloat(mms_value)
+    elif mms_value_type == 'structure':
+        array_size = iec61850.MmsValue_getArraySize(mms_value)
+        return [read_mms_value(iec61850.MmsValue_getElement(mms_value, i))
+                for i in range(array_size)]
+    else:
+        print(f'Unsupported MMS value type {mms_value_type}')
+        return None
+
+
+def _analogue_value_decoder(read):
+    # AnalogueValue is a structure of either i or f, decoded as [value] like read_mms_value does
+    return lambda mms_value: [read(iec61850.MmsValue_getElement(mms_value, 0))]
+
+
+# Decoders of ctlVal, resolved once per controllable data object
+CONTROL_DECODERS = {
+    'boolean': iec61850.MmsValue_getBoolean,
+    'int32': iec61850.MmsValue_toInt32,
+    'int64': iec61850.MmsValue_toInt64,
+    'uint32': iec61850.MmsValue_toUint32,
+    'float': iec61850.MmsValue_toFloat,
+    'bitstring': iec61850.MmsValue_getBitStringAsInteger,
+    'analogue_int': _analogue_value_decoder(iec61850.MmsValue_toInt32),
+    'analogue_float': _analogue_value_decoder(iec61850.MmsValue_toFloat),
+    'structure': read_mms_value,
+}
+
+# Type of ctlVal created by libiec61850 for each controllable CDC
+CDC_CONTROL_TYPES = {
+    'SPC': 'boolean',
+    'DPC': 'boolean',
+    'INC': 'int32',
+    'ENC': 'int32',
+    'ISC': 'int32',
+    'BSC': 'bitstring',
+}
+
+
+def get_control_type(config):
+    if 'control_type' in config:
+        return config['control_type']
+    if config['cdc'] in ['APC', 'BAC']:
+        return 'analogue_int' if config.get('isIntegerNotFloat', False) else 'analogue_float'
+    return CDC_CONTROL_TYPES[config['cdc']]
+
+
 UPDATERS = {
     'int32': iec61850.IedServer_updateInt32AttributeValue,
     'int64': iec61850.IedServer_updateInt64AttributeValue,
@@ -74,6 +132,14 @@ UPDATERS = {
     'uint32': iec61850.IedServer_updateUnsignedAttributeValue,
 }
 
+READERS = {
+    'int32': iec61850.MmsValue_toInt32,
+    'int64': iec61850.MmsValue_toInt64,
+    'float': iec61850.MmsValue_toFloat,
+    'boolean': iec61850.MmsValue_getBoolean,
+    'uint32': iec61850.MmsValue_toUint32,
+}
+
 TRIGGER_OPTIONS = {
     'data_changed': iec61850.TRG_OPT_DATA_CHANGED,
     'data_updated': iec61850.TRG_OPT_DATA_UPDATE,
@@ -93,38 +159,198 @@ REPORT_OPTIONS = {
     'buffer_overflow': iec61850.RPT_OPT_BUFFER_OVERFLOW,
 }
 
+EDITIONS = {
+    '1': iec61850.IEC_61850_EDITION_1,
+    '2': iec61850.IEC_61850_EDITION_2,
+    '2.1': iec61850.IEC_61850_EDITION_2_1,
+}
+
+# Same as the defaults of libiec61850
+SERVER_CONFIG_DEFAULTS = {
+    'report_buffer_size': 65536,
+    'max_mms_connections': 5,
+    'dynamic_data_set_service': True,
+    'file_service': True,
+    'edition': '2',
+    # drive the MMS stack from a single loop of the proxy instead of the libiec61850 threads
+    'threadless': False,
+    'tick_interval': 100,  # ms, the longest wait for incoming data in threadless mode
+}
+
+
+def load_server_config(config):
+    server_config = dict(SERVER_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in server_config:
+            raise ValueError('Unknown server config: {}'.format(key))
+        if type(value) is not type(SERVER_CONFIG_DEFAULTS[key]):
+            raise ValueError('Server config {} must be {}, got {!r}'.format(
+                key, type(SERVER_CONFIG_DEFAULTS[key]).__name__, value))
+        server_config[key] = value
+
+    for key in ['report_buffer_size', 'max_mms_connections', 'tick_interval']:
+        if server_config[key] <= 0:
+            raise ValueError('Server config {} must be positive, got {}'.format(
+                key, server_config[key]))
+    if server_config['edition'] not in EDITIONS:
+        raise ValueError('Server config edition must be one of {}, got {!r}'.format(
+            list(EDITIONS), server_config['edition']))
+
+    return server_config
+
+
+def create_ied_server_config(server_config):
+    config = iec61850.IedServerConfig_create()
+    iec61850.IedServerConfig_setReportBufferSize(config, server_config['report_buffer_size'])
+    iec61850.IedServerConfig_setMaxMmsConnections(config, server_config['max_mms_connections'])
+    iec61850.IedServerConfig_enableDynamicDataSetService(
+        config, server_config['dynamic_data_set_service'])
+    iec61850.IedServerConfig_enableFileService(config, server_config['file_service'])
+    iec61850.IedServerConfig_setEdition(config, EDITIONS[server_config['edition']])
+    return config
+
+
+# keys the loaders below read without a default
+REQUIRED_KEYS = {
+    'logical node': ['name'],
+    'data object': ['name', 'cdc'],
+    'data attribute': ['name', 'data_type'],
+    'data set': ['name'],
+    'data set entry': ['variable'],
+    'report': ['name', 'report_id', 'indexed', 'buffered', 'data_set', 'configuration_revision',
+               'buffer_time', 'integrity_period'],
+}
+
+
+def validate_logical_nodes(ln_configs):
+    def check(values, known, what, owner):
+        unknown = set(values) - set(known)
+        if unknown:
+            raise ValueError('Unknown {} {} in {}'.format(what, sorted(unknown), owner))
+
+    def require(config, what, owner):
+        # a missing key would otherwise surface as a KeyError halfway through loading
+        if not isinstance(config, dict):
+            raise ValueError('{} in {} must be an object, got {!r}'.format(what, owner, config))
+        missing = [key for key in REQUIRED_KEYS[what] if key not in config]
+        if missing:
+            raise ValueError('Missing {} of {} in {}'.format(missing, what, owner))
+
+    for ln_config in ln_configs:
+        require(ln_config, 'logical node', 'logical nodes')
+        ln_name = ln_config['name']
+        for do_config in ln_config.get('data_objects', []):
+            require(do_config, 'data object', ln_name)
+            owner = '{}.{}'.format(ln_name, do_config['name'])
+            check([do_config['cdc']], CDC_CREATORS, 'CDC', owner)
+            for name in OPTION_MAP:
+                check(do_config.get(name, []), OPTION_MAP[name], name, owner)
+            for da_config in do_config.get('data_attributes', []):
+                require(da_config, 'data attribute', owner)
+            check([da_config['data_type'] for da_config in do_config.get('data_attributes', [])],
+                  UPDATERS, 'data types', owner)
+            if 'control_type' in do_config:
+                check([do_config['control_type']], CONTROL_DECODERS, 'control type', owner)
+        for ds_config in ln_config.get('data_sets', []):
+            require(ds_config, 'data set', ln_name)
+            owner = '{}.{}'.format(ln_name, ds_config['name'])
+            for entry in ds_config.get('entries', []):
+                require(entry, 'data set entry', owner)
+            for report in ds_config.get('reports', []):
+                require(report, 'report', owner)
+                report_owner = '{}.{}'.format(ln_name, report['name'])
+                check(report.get('trigger_options', []), TRIGGER_OPTIONS, 'trigger options',
+                      report_owner)
+                check(report.get('report_options', []), REPORT_OPTIONS, 'report options',
+                      report_owner)
+
 
 def load_extra_do_args(config, args):
     def process_arg(arg):
         name = arg['name']
         _value = config.get(name, arg['default'])
-        if name in ['options', 'controlOptions']:
+        if name in OPTION_MAP:
             return reduce(lambda value, option: value | OPTION_MAP[name][option], _value, 0)
         else:
             return _value
     return list(map(lambda arg: process_arg(arg), args))
 
 
+class ModelInfo():
+    __slots__ = ('inst', 'logical_devices', 'data_attributes')
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.logical_devices = {}
+        self.data_attributes = {}  # index of data attributes by path
+
+
+class LogicalDeviceInfo():
+    __slots__ = ('name', 'inst', 'logical_nodes')
+
+    def __init__(self, name, inst):
+        self.name = name
+        self.inst = inst
+        self.logical_nodes = {}
+
+
+class LogicalNodeInfo():
+    __slots__ = ('name', 'path', 'inst', 'data_objects')
+
+    def __init__(self, name, path, inst):
+        self.name = name
+        self.path = path
+        self.inst = inst
+        self.data_objects = {}
+
+
+class DataObjectInfo():
+    __slots__ = ('name', 'path', 'inst', 'cdc', 'controllable', 'decoder', 'data_attributes')
+
+    def __init__(self, name, path, inst, cdc, decoder=None):
+        self.name = name
+        self.path = path
+        self.inst = inst
+        self.cdc = cdc
+        self.controllable = cdc in CONTROLLABLE_CDC
+        self.decoder = decoder  # decoder of ctlVal, only for controllable data objects
+        self.data_attributes = {}
+
+
+class DataAttributeInfo():
+    __slots__ = ('name', 'path', 'inst', 'data_type')
+
+    def __init__(self, name, path, inst, data_type):
+        self.name = name
+        self.path = path
+        self.inst = inst
+        self.data_type = data_type
+
+
 def load_data_object(ln, config):
     creator = CDC_CREATORS[config['cdc']]
     extra_args = load_extra_do_args(config, creator['extra_args'])
-    do = {
-        'inst': creator['fn'](
-            config['name'],
-            iec61850.toModelNode(ln['inst']),
+    name = sys.intern(config['name'])
+    do = DataObjectInfo(
+        name,
+        '{}.{}'.format(ln.path, name),
+        creator['fn'](
+            name,
+            iec61850.toModelNode(ln.inst),
             *extra_args),
-        'controllable': (config['cdc'] in CONTROLLABLE_CDC),
-        'data_attributes': {},
-    }
+        # CDC and data type names are few, interning makes every node share them
+        sys.intern(config['cdc']),
+        CONTROL_DECODERS[get_control_type(config)] if config['cdc'] in CONTROLLABLE_CDC else None)
     for da_config in config.get('data_attributes', []):
+        da_name = sys.intern(da_config['name'])
         child = iec61850.ModelNode_getChild(
-            iec61850.toModelNode(do['inst']), da_config['name'])
-        da_inst = iec61850.toDataAttribute(child)
-        do['data_attributes'][da_config['name']] = {
-            'inst': da_inst,
-            'data_type': da_config['data_type'],
-        }
-    ln['data_objects'][config['name']] = do
+            iec61850.toModelNode(do.inst), da_name)
+        do.data_attributes[da_name] = DataAttributeInfo(
+            da_name,
+            '{}.{}'.format(do.path, da_name),
+            iec61850.toDataAttribute(child),
+            sys.intern(da_config['data_type']))
+    ln.data_objects[name] = do
 
 
 def load_report(report, ln):
@@ -142,7 +368,7 @@ def load_report(report, ln):
         report_id = report['report_id']
     iec61850.ReportControlBlock_create(
         name,
-        ln['inst'],
+        ln.inst,
         report_id,
         report['buffered'],
         report['data_set'],
@@ -154,7 +380,7 @@ def load_report(report, ln):
 
 
 def load_data_set(ln, config):
-    data_set = iec61850.DataSet_create(config['name'], ln['inst'])
+    data_set = iec61850.DataSet_create(config['name'], ln.inst)
     for entry in config.get('entries', []):
         '''
         Note:
@@ -175,50 +401,49 @@ def load_data_set(ln, config):
 
 
 def load_logical_node(ld, config):
-    ln = {
-        'inst': iec61850.LogicalNode_create(config['name'], ld['inst']),
-        'data_objects': {},
-    }
+    name = sys.intern(config['name'])
+    ln = LogicalNodeInfo(
+        name, '{}/{}'.format(ld.name, name), iec61850.LogicalNode_create(name, ld.inst))
     for do_config in config.get('data_objects', []):
         load_data_object(ln, do_config)
     for ds_config in config.get('data_sets', []):
         load_data_set(ln, ds_config)
-    ld['logical_nodes'][config['name']] = ln
+    ld.logical_nodes[name] = ln
 
 
 def load_logical_device(model, config):
-    ld = {
-        'inst': iec61850.LogicalDevice_create(config['name'], model['inst']),
-        'logical_nodes': {}
-    }
+    ld = LogicalDeviceInfo(
+        config['name'], iec61850.LogicalDevice_create(config['name'], model.inst))
     for ln_config in config.get('logical_nodes', []):
         load_logical_node(ld, ln_config)
-    model['logical_devices'][config['name']] = ld
+    model.logical_devices[ld.name] = ld
+    index_logical_device(model, ld)
 
 
-def find_data_attribute(model, da_path):
-    ld, rest = da_path.split('/', 1)
-    ln, do, da = rest.split('.', 2)
+def index_logical_device(model, ld):
+    for ln in ld.logical_nodes.values():
+        for do in ln.data_objects.values():
+            for da in do.data_attributes.values():
+                model.data_attributes[da.path] = da
 
-    ld_info = model['logical_devices'][ld]
-    ln_info = ld_info['logical_nodes'][ln]
-    do_info = ln_info['data_objects'][do]
-    return do_info['data_attributes'][da]
+
+def find_data_attribute(model, da_path):
+    return model.data_attributes[da_path]
 
 
 def get_data_objects(model):
-    for ld_name, ld_info in model['logical_devices'].items():
-        for ln_name, ln_info in ld_info['logical_nodes'].items():
-            for do_name, do_info in ln_info['data_objects'].items():
-                do_info['path'] = '{}/{}.{}'.format(ld_name, ln_name, do_name)
-                yield do_info
-
-def load_model(model_config):
-    model = {
-        'inst': iec61850.IedModel_create(model_config['name']),
-        'logical_devices': {},
-    }
-    for ld_config in model_config.get('logical_devices', []):
-        load_logical_device(model, ld_config)
+    for ld in model.logical_devices.values():
+        for ln in ld.logical_nodes.values():
+            yield from ln.data_objects.values()
+
+
+def load_model(name, ld_configs, templates):
+    model = ModelInfo(iec61850.IedModel_create(name))
+    try:
+        for ld_config in expand_logical_devices(ld_configs):
+            load_logical_device(model, resolve_logical_device(ld_config, templates))
+    except Exception:
+        iec61850.IedModel_destroy(model.inst)
+        raise
 
     return model
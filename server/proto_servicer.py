@@ -1,34 +1,251 @@
+import grpc
 import json
+import time
 import taipower_ancillary_pb2
 import taipower_ancillary_pb2_grpc
 
+from admission import AdmissionController
+from control_events import DISCONNECT, DROP_NEWEST, DROP_OLDEST
+from metrics import METRICS
+from model_loader import validate_logical_nodes
+
+
+POINT_VALUE_FIELDS = {
+    'int32': 'int_value',
+    'int64': 'int_value',
+    'uint32': 'uint_value',
+    'float': 'float_value',
+    'boolean': 'bool_value',
+}
+
+DEFAULT_BATCH_SIZE = 1000
+
+DEFAULT_SUBSCRIPTION_BUFFER_SIZE = 1000
+
+SLOW_CONSUMER_POLICIES = {
+    taipower_ancillary_pb2.WatchControlCommandsRequest.DROP_OLDEST: DROP_OLDEST,
+    taipower_ancillary_pb2.WatchControlCommandsRequest.DROP_NEWEST: DROP_NEWEST,
+    taipower_ancillary_pb2.WatchControlCommandsRequest.DISCONNECT: DISCONNECT,
+}
+
+
+# fields of DataObject passed to the CDC creators, by their names in points.json
+DATA_OBJECT_OPTIONS = {
+    'options': 'options',
+    'control_options': 'controlOptions',
+    'wp_options': 'wpOptions',
+}
+
+DATA_OBJECT_ARGS = {
+    'max_pts': 'maxPts',
+    'has_old_status': 'hasOldStatus',
+    'has_transient_indicator': 'hasTransientIndicator',
+    'has_cm_tm': 'hasCmTm',
+    'has_cm_ct': 'hasCmCt',
+    'has_his_rs': 'hasHisRs',
+    'has_cha_man_rs': 'hasChaManRs',
+    'is_integer_not_float': 'isIntegerNotFloat',
+}
+
+
+def to_data_object_config(data_object):
+    # defaults are left out, they are the same in the proto and in model_loader
+    config = {'name': data_object.name, 'cdc': data_object.cdc}
+    for field, key in DATA_OBJECT_OPTIONS.items():
+        options = getattr(data_object, field)
+        if options:
+            config[key] = list(options)
+    for field, key in DATA_OBJECT_ARGS.items():
+        value = getattr(data_object, field)
+        if value:
+            config[key] = value
+    if data_object.control_type:
+        config['control_type'] = data_object.control_type
+    if data_object.data_attributes:
+        config['data_attributes'] = [
+            {'name': da.name, 'fc': da.fc, 'data_type': da.data_type}
+            for da in data_object.data_attributes
+        ]
+    return config
+
+
+def to_report_config(report):
+    return {
+        'name': report.name,
+        'report_id': report.report_id,
+        'indexed': report.indexed,
+        'buffered': report.buffered,
+        'data_set': report.data_set,
+        'configuration_revision': report.configuration_revision,
+        'trigger_options': list(report.trigger_options),
+        'report_options': list(report.report_options),
+        'buffer_time': report.buffer_time,
+        'integrity_period': report.integrity_period,
+    }
+
+
+def to_logical_node_config(node):
+    config = {'name': node.name}
+    if node.data_objects:
+        config['data_objects'] = list(map(to_data_object_config, node.data_objects))
+    if node.data_sets:
+        config['data_sets'] = [{
+            'name': data_set.name,
+            'entries': [{'variable': entry} for entry in data_set.entries],
+            'reports': list(map(to_report_config, data_set.reports)),
+        } for data_set in node.data_sets]
+    return config
+
+
+def to_control_command(command):
+    value = command['value']
+    if isinstance(value, bool):
+        value_field = {'bool_value': value}
+    elif isinstance(value, int):
+        value_field = {'int_value': value}
+    elif isinstance(value, float):
+        value_field = {'float_value': value}
+    else:
+        value_field = {'json_value': json.dumps(value)}
+    return taipower_ancillary_pb2.ControlCommand(
+        id=command['id'],
+        path=command['path'],
+        originator_category=command.get('originator_category', 0),
+        control_number=command.get('control_number', 0),
+        control_time=command.get('control_time', 0),
+        test=command['test'],
+        received_at=command['received_at'],
+        **value_field)
+
 
 class AncillaryInputsServicer(taipower_ancillary_pb2_grpc.AncillaryInputsServicer):
-    def __init__(self, servant):
+    def __init__(self, servant, admission_config, recorder=None):
         self._servant = servant
+        self._admission = AdmissionController(admission_config)
+        self._recorder = recorder
+
+    @staticmethod
+    def _shed(context, name):
+        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                      'Too many {} calls, retry later'.format(name))
+
+    @staticmethod
+    def _load_logical_nodes(message):
+        if message.nodes:
+            return list(map(to_logical_node_config, message.nodes))
+        return json.loads(message.logical_nodes)
 
     @staticmethod
     def _load_logical_devices(devices):
         for device in devices:
-            yield {
-                'name': device.name,
-                'logical_nodes': json.loads(device.logical_nodes),
-            }
+            if device.template:
+                logical_device = {'name': device.name, 'template': device.template}
+                if device.codes:
+                    logical_device['codes'] = list(device.codes)
+                yield logical_device
+                continue
+            logical_nodes = AncillaryInputsServicer._load_logical_nodes(device)
+            # rejected before the model is touched, templates are checked when compiled
+            validate_logical_nodes(logical_nodes)
+            yield {'name': device.name, 'logical_nodes': logical_nodes}
+
+    @staticmethod
+    def _load_templates(templates):
+        return {
+            template.name: {'logical_nodes': AncillaryInputsServicer._load_logical_nodes(template)}
+            for template in templates
+        }
 
     def update_point_values(self, request, context):
-        self._servant.update_value(json.loads(request.values))
+        values = json.loads(request.values)
+        if self._recorder:
+            # recorded as received, including the batches shed below
+            self._recorder.record_update(values)
+        priority = self._admission.priority_of(values)
+        with self._admission.admit('update_point_values', priority) as admitted:
+            if not admitted:
+                self._shed(context, 'update_point_values')
+            self._servant.update_value(values)
         return taipower_ancillary_pb2.Response(success=True)
 
     def add_logical_devices(self, request, context):
-        devices = list(AncillaryInputsServicer._load_logical_devices(request.devices))
-        self._servant.add_logical_devices(devices)
+        with self._admission.admit('add_logical_devices') as admitted:
+            if not admitted:
+                self._shed(context, 'add_logical_devices')
+            try:
+                devices = list(AncillaryInputsServicer._load_logical_devices(request.devices))
+                templates = AncillaryInputsServicer._load_templates(request.templates)
+                self._servant.add_logical_devices(devices, templates)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         return taipower_ancillary_pb2.Response(success=True)
 
     def reset_logical_devices(self, request, context):
-        devices = list(AncillaryInputsServicer._load_logical_devices(request.devices))
-        self._servant.reset_logical_devices(devices)
+        with self._admission.admit('reset_logical_devices') as admitted:
+            if not admitted:
+                self._shed(context, 'reset_logical_devices')
+            try:
+                devices = list(AncillaryInputsServicer._load_logical_devices(request.devices))
+                templates = AncillaryInputsServicer._load_templates(request.templates)
+                self._servant.reset_logical_devices(devices, templates)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
         return taipower_ancillary_pb2.Response(success=True)
 
     def restart_ied_server(self, request, context):
-        self._servant.restart_ied_server()
+        with self._admission.admit('restart_ied_server') as admitted:
+            if not admitted:
+                self._shed(context, 'restart_ied_server')
+            self._servant.restart_ied_server()
         return taipower_ancillary_pb2.Response(success=True)
+
+    def get_metrics(self, request, context):
+        return taipower_ancillary_pb2.GetMetricsResponse(metrics=json.dumps(METRICS.snapshot()))
+
+    def get_client_connections(self, request, context):
+        return taipower_ancillary_pb2.GetClientConnectionsResponse(
+            connections=json.dumps(self._servant.get_client_connections()))
+
+    def get_point_values(self, request, context):
+        with self._admission.admit('get_point_values') as admitted:
+            if not admitted:
+                self._shed(context, 'get_point_values')
+            # each batch is read when it is sent, the gate is held until the stream ends
+            for values in self._servant.get_point_values(
+                    request.paths, request.prefixes, request.logical_devices, request.from_model,
+                    request.batch_size or DEFAULT_BATCH_SIZE):
+                yield taipower_ancillary_pb2.PointValues(values=[
+                    taipower_ancillary_pb2.PointValue(
+                        path=path, data_type=data_type, **{POINT_VALUE_FIELDS[data_type]: value})
+                    for path, data_type, value in values
+                ])
+
+    def get_point_history(self, request, context):
+        try:
+            data_type, timestamps, values = self._servant.get_point_history(
+                # an unset end time is now
+                request.path, request.start_time, request.end_time or time.time())
+        except KeyError:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No history for {}'.format(request.path))
+        return taipower_ancillary_pb2.PointHistory(
+            path=request.path, data_type=data_type, timestamps=timestamps,
+            **{POINT_VALUE_FIELDS[data_type] + 's': values})
+
+    def watch_control_commands(self, request, context):
+        # a stream holds its worker thread until it ends, max_subscribers of them at most
+        with self._admission.admit_subscriber() as admitted:
+            if not admitted:
+                self._shed(context, 'watch_control_commands')
+            subscription = self._servant.subscribe_control_commands(
+                request.buffer_size or DEFAULT_SUBSCRIPTION_BUFFER_SIZE,
+                SLOW_CONSUMER_POLICIES[request.policy])
+            try:
+                while context.is_active():
+                    command = subscription.get(timeout=1)
+                    if subscription.closed:
+                        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                      'Subscriber is too slow, control commands were not consumed')
+                    if command is not None:
+                        yield to_control_command(command)
+            finally:
+                self._servant.unsubscribe_control_commands(subscription)
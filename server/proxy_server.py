@@ -1,58 +1,176 @@
-import json
+import argparse
+import functools
+import itertools
 import signal
+import threading
+import time
 import grpc
 import iec61850
 import os
-import taipower_ancillary_pb2
 import taipower_ancillary_pb2_grpc
 
 from concurrent import futures
-from model_loader import (UPDATERS,
+from model_loader import (READERS,
+                          UPDATERS,
+                          create_ied_server_config,
                           load_model,
+                          load_server_config,
+                          validate_logical_nodes,
                           load_logical_device,
                           find_data_attribute,
                           get_data_objects,)
-from proto_servicer import AncillaryInputsServicer
-
-
-def read_mms_value(mms_value):
-    mms_value_type = iec61850.MmsValue_getTypeString(mms_value)
-    if mms_value_type == 'boolean':
-        return iec61850.MmsValue_getBoolean(mms_value)
-    elif mms_value_type == 'integer':
-        return iec61850.MmsValue_toInt32(mms_value)
-    elif mms_value_type == 'float':
-        return iec61850.MmsValue_toFloat(mms_value)
-    elif mms_value_type == 'structure':
-        array_size = iec61850.MmsValue_getArraySize(mms_value)
-        return [read_mms_value(iec61850.MmsValue_getElement(mms_value, i)) for i in range(array_size)]
-    else:
-        print(f'Unsupported MMS value type {mms_value_type}')
-        return None
+from admission import load_admission_config
+from backend_router import BackendRouter
+from config_loader import (CompactConfig,
+                           compile_templates,
+                           expand_logical_devices,
+                           resolve_logical_device,)
+from config_watcher import ConfigWatcher, load_reload_config
+from connection_tracker import ConnectionTracker
+from control_dedup import ControlDeduplicator, control_key, load_dedup_config
+from control_events import ControlEventBroker
+from history import HistoryStore, load_history_config
+from metrics import METRICS
+from proto_servicer import AncillaryInputsServicer, to_control_command
+from traffic_recorder import TrafficRecorder, load_recorder_config
 
 
 class ProxyServer():
-    def __init__(self, config_path, ancillary_backend_server_address):
+    def __init__(self, config_path, ancillary_backend_server_address,
+                 iec_port=102, grpc_port=61850, iec_address=None):
         self._running = False
-        self._iec_port = 102
-        self._grpc_port = 61850
+        self._iec_port = iec_port
+        self._grpc_port = grpc_port
+        self._iec_address = iec_address  # listen on all addresses when None
         self._ancillary_backend_server_address = ancillary_backend_server_address
 
+        self._lock = threading.RLock()
+        # held while the model and its config are changed (add, reset, restart and reload),
+        # the models are built outside of _lock so updates are not blocked meanwhile
+        self._mutation_lock = threading.Lock()
+        # last value written to each data attribute, restored after the IED server is swapped
+        self._values = {}
+        self._connections = ConnectionTracker()
+        self._control_ids = itertools.count(1)
+        self._control_events = ControlEventBroker()
+
         self._config_path = config_path
-        with open(config_path) as f:
-            self._model_config = json.load(f)
-        self._model = load_model(self._model_config)
+        # logical devices are parsed one at a time and kept compressed, not as dicts
+        self._model_config = CompactConfig.load(config_path)
+        self._server_config = load_server_config(self._model_config.get('server', {}))
+        self._admission_config = load_admission_config(self._model_config.get('admission', {}))
+        self._templates = compile_templates(
+            self._model_config.get('templates', {}), validate_logical_nodes)
+        self._model = self._load_model()
+        self._history = self._load_history(self._model_config.get('history'))
+        self._recorder = self._load_recorder(self._model_config.get('recorder'))
+        self._dedup = self._load_dedup(self._model_config.get('control_dedup'))
+        self._backends = BackendRouter(
+            self._model_config.get('backends', []), self._ancillary_backend_server_address)
+        self._watcher = self._load_watcher(self._model_config.get('reload'))
+
+    def _load_watcher(self, config):
+        if config is None:
+            return None
+        return ConfigWatcher(
+            self._config_path, self.reload_model_config, load_reload_config(config))
+
+    def _load_model(self):
+        return load_model(
+            self._model_config.name, self._model_config.iter_logical_devices(), self._templates)
+
+    def _merge_templates(self, templates):
+        """The compiled templates with the new ones, nothing is changed yet."""
+        if not templates:
+            return self._templates
+        print('Add templates: {}'.format(list(templates)))
+        merged = dict(self._templates)
+        merged.update(compile_templates(templates, validate_logical_nodes))
+        return merged
+
+    def _commit_templates(self, compiled, templates):
+        if templates:
+            self._templates = compiled
+            self._model_config.header.setdefault('templates', {}).update(templates)
+
+    def _data_types(self):
+        return {da_path: da_info.data_type
+                for da_path, da_info in self._model.data_attributes.items()}
+
+    def _load_history(self, config):
+        if config is None:
+            return None
+        return HistoryStore(load_history_config(config), self._data_types())
 
-    def _init_ied_server(self):
-        print('Start MMS server at port {}'.format(self._iec_port))
-        self._ied_server = iec61850.IedServer_create(self._model['inst'])
-        self._bind_controll_handler()
+    def _update_history(self):
+        # points added by add, reset or reload are recorded, removed ones are dropped
+        if self._history:
+            self._history.update_data_types(self._data_types())
 
-        # MMS server will be instructed to start listening to client connections.
-        iec61850.IedServer_start(self._ied_server, self._iec_port)
+    def _load_recorder(self, config):
+        if config is None:
+            return None
+        recorder_config = load_recorder_config(config)
+        print('Record traffic to {}'.format(recorder_config['path']))
+        return TrafficRecorder(recorder_config)
 
-        if not iec61850.IedServer_isRunning(self._ied_server):
+    def _load_dedup(self, config):
+        if config is None:
+            return None
+        return ControlDeduplicator(load_dedup_config(config))
+
+    def _create_ied_server(self, model):
+        print('Create MMS server with config {}'.format(self._server_config))
+        ied_server_config = create_ied_server_config(self._server_config)
+        ied_server = iec61850.IedServer_createWithConfig(model.inst, None, ied_server_config)
+        # the server keeps a copy of the settings
+        iec61850.IedServerConfig_destroy(ied_server_config)
+        if self._iec_address:
+            iec61850.IedServer_setLocalIpAddress(ied_server, self._iec_address)
+        handler_contexts = self._bind_controll_handler(ied_server, model)
+        handler_contexts.append(self._bind_connection_handler(ied_server))
+        return ied_server, handler_contexts
+
+    def _start_ied_server(self):
+        print('Start MMS server at {}:{}'.format(self._iec_address or '*', self._iec_port))
+        if self._server_config['threadless']:
+            iec61850.IedServer_startThreadless(self._ied_server, self._iec_port)
+            self._mms_loop_stopped = threading.Event()
+            self._mms_loop = threading.Thread(
+                target=self._run_mms_loop, args=(self._ied_server, self._mms_loop_stopped))
+            self._mms_loop.start()
+        else:
+            # MMS server will be instructed to start listening to client connections.
+            iec61850.IedServer_start(self._ied_server, self._iec_port)
+        return iec61850.IedServer_isRunning(self._ied_server)
+
+    def _stop_ied_server(self):
+        if self._server_config['threadless']:
+            self._mms_loop_stopped.set()
+            self._mms_loop.join()
+            iec61850.IedServer_stopThreadless(self._ied_server)
+        else:
+            iec61850.IedServer_stop(self._ied_server)
+
+    def _run_mms_loop(self, ied_server, stopped):
+        print('Run threadless MMS loop')
+        tick_interval = self._server_config['tick_interval']
+        while not stopped.is_set():
+            # GIL is released while waiting and processing, control handlers take it back
+            if iec61850.IedServer_waitReady_no_gil(ied_server, tick_interval) > 0:
+                started_at = time.monotonic()
+                iec61850.IedServer_processIncomingData_no_gil(ied_server)
+                METRICS.observe('mms_tick_seconds', time.monotonic() - started_at)
+            iec61850.IedServer_performPeriodicTasks(ied_server)
+        print('Threadless MMS loop stopped')
+
+    def _init_ied_server(self):
+        self._ied_server, self._handler_contexts = self._create_ied_server(self._model)
+        if not self._start_ied_server():
             print("Starting server failed! Exit.\n")
+            if self._server_config['threadless']:
+                self._mms_loop_stopped.set()
+                self._mms_loop.join()
             iec61850.IedServer_destroy(self._ied_server)
             return False
 
@@ -61,22 +179,62 @@ class ProxyServer():
     def _destroy_ied_server(self):
         print('Stop MMS server')
         # stop MMS server - close TCP server socket and all client sockets
-        iec61850.IedServer_stop(self._ied_server)
+        self._stop_ied_server()
 
         # Cleanup - free all resources
         iec61850.IedServer_destroy(self._ied_server)
 
+    def _restore_values(self, ied_server, model):
+        iec61850.IedServer_lockDataModel(ied_server)
+        for da_path, value in self._values.items():
+            da_info = model.data_attributes.get(da_path)
+            if da_info is None:
+                # the point does not exist in the new model anymore
+                continue
+            UPDATERS[da_info.data_type](ied_server, da_info.inst, value)
+        iec61850.IedServer_unlockDataModel(ied_server)
+
+    def _swap_ied_server(self, model):
+        # Everything that takes time (model building, indexing and binding control handlers)
+        # is done while the running server keeps serving its clients.
+        ied_server, handler_contexts = self._create_ied_server(model)
+
+        with self._lock:
+            self._restore_values(ied_server, model)
+
+            # Clients are disconnected from here until the new server is listening
+            stopped_at = time.monotonic()
+            self._stop_ied_server()
+            old_ied_server, old_model = self._ied_server, self._model
+            # Keep the old handler contexts alive until the old server is destroyed
+            old_handler_contexts = self._handler_contexts
+            self._ied_server, self._model, self._handler_contexts =\
+                ied_server, model, handler_contexts
+            self._update_history()
+            self._running = self._start_ied_server()
+            outage = time.monotonic() - stopped_at
+
+        METRICS.observe('ied_server_restart_outage_seconds', outage)
+        print('IED server swapped, running={} outage_ms={:.1f}'.format(
+            self._running, outage * 1000))
+
+        iec61850.IedServer_destroy(old_ied_server)
+        iec61850.IedModel_destroy(old_model.inst)
+        del old_handler_contexts
+        return self._running
+
     def _init_grpc_server(self):
         print('Start gRPC server at port {}'.format(self._grpc_port))
-        self._outward_grpc_channel = grpc.insecure_channel(self._ancillary_backend_server_address)
-        self._outward_stub = taipower_ancillary_pb2_grpc.AncillaryOutputsStub(self._outward_grpc_channel)
-
-        self._grpc_server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
+        self._grpc_server = grpc.server(
+            futures.ThreadPoolExecutor(max_workers=self._admission_config['max_workers']
+                                       + self._admission_config['max_subscribers']),
+            maximum_concurrent_rpcs=self._admission_config['max_concurrent_rpcs'])
         taipower_ancillary_pb2_grpc.add_AncillaryInputsServicer_to_server(
-            AncillaryInputsServicer(self), self._grpc_server)
+            AncillaryInputsServicer(self, self._admission_config, self._recorder),
+            self._grpc_server)
         self._grpc_server.add_insecure_port('[::]:{}'.format(self._grpc_port))
 
-    def handle_control_cmd(self, action, parameter, mms_value, test):
+    def handle_control_cmd(self, backend, decode, action, parameter, mms_value, test):
         # FIXME: the control handler is blocking (process one control command at a time)
         #
         # Since we use gRPC to communicate with the ancillary backend server,
@@ -88,39 +246,84 @@ class ProxyServer():
         # - Update the code to use ControlHandlerForPython
         reference = parameter
         print(f'Handle control command: {reference}')
+        command = {
+            'id': next(self._control_ids),
+            'path': reference,
+            'test': test,
+            'received_at': time.time(),
+        }
+        originator_identifier = None
         try:
-            # FIXME: type of orIdentSize should be int*, so 1024 is not correct
-            # print(f'Originator Identifier: {iec61850.ControlAction_getOrIdent(action, 1024)}')
-            print(f'Originator Category: {iec61850.ControlAction_getOrCat(action)}')
-            print(f'Control Number: {iec61850.ControlAction_getCtlNum(action)}')
-            print(f'Control Time: {iec61850.ControlAction_getControlTime(action)}')
+            connection = iec61850.ControlAction_getClientConnection(action)
+            peer_address = iec61850.ClientConnection_getPeerAddress(connection)
+            print(f'Client: {peer_address}')
+            self._connections.record_control(peer_address, reference)
+            originator_identifier = iec61850.ControlAction_getOrIdentBytes(action)
+            print(f'Originator Identifier: {originator_identifier}')
+            command['originator_category'] = iec61850.ControlAction_getOrCat(action)
+            command['control_number'] = iec61850.ControlAction_getCtlNum(action)
+            command['control_time'] = iec61850.ControlAction_getControlTime(action)
+            print(f'Originator Category: {command["originator_category"]}')
+            print(f'Control Number: {command["control_number"]}')
+            print(f'Control Time: {command["control_time"]}')
         except Exception as e:
             print(f'Exception: {e}')
 
-        value = read_mms_value(mms_value)
-        print(f'Update {reference} to {value}')
-        try:
-            response = self._outward_stub.update_point_values(
-                taipower_ancillary_pb2.UpdatePointValuesRequest(values=json.dumps({reference: value})))
-            print(f'Handled control command: {reference}')
-            return response
-        except Exception as e:
-            print(f'Exception: {e}')
-            return None
+        value = decode(mms_value)
+        command['value'] = value
+        if self._recorder:
+            self._recorder.record_control(command)
 
+        def forward():
+            self._control_events.publish(command)
+            print(f'Update {reference} to {value}')
+            return backend.forward(to_control_command(command), reference, value)
 
-    def _bind_controll_handler(self):
+        key = control_key(command, originator_identifier) if self._dedup else None
+        if key is None:
+            return forward()
+        # retries of the same operate are answered without another call to the backend
+        return self._dedup.run(key, forward)
+
+    def _bind_controll_handler(self, ied_server, model):
         print('Bind control handler')
-        for do_info in get_data_objects(self._model):
-            if not do_info['controllable']:
+        # The native side only borrows the contexts, they must outlive the server they are bound to
+        contexts = []
+        for do_info in get_data_objects(model):
+            if not do_info.controllable:
                 continue
 
-            context = iec61850.transformControlHandlerContext((self, self.handle_control_cmd, do_info['path']))
-            if not context:
+            # the backend and the ctlVal decoder are resolved once here instead of on every command
+            backend = self._backends.resolve(do_info.path)
+            handler = functools.partial(self.handle_control_cmd, backend, do_info.decoder)
+            context = (self, handler, do_info.path)
+            handler_context = iec61850.transformControlHandlerContext(context)
+            if not handler_context:
                 break
 
             iec61850.IedServer_setControlHandler(
-                self._ied_server, do_info['inst'], iec61850.ControlHandlerProxy, context)
+                ied_server, do_info.inst, iec61850.ControlHandlerProxy, handler_context)
+            contexts.append(context)
+        return contexts
+
+    def _bind_connection_handler(self, ied_server):
+        print('Bind connection handler')
+        # The number of connections is capped by server.max_mms_connections, the MMS stack
+        # refuses extra TCP connections before any association is made.
+        context = (self, self._connections.handle_connection)
+        handler_context = iec61850.transformConnectionIndicationHandlerContext(context)
+        iec61850.IedServer_setConnectionIndicationHandler(
+            ied_server, iec61850.ConnectionIndicationHandlerProxy, handler_context)
+        return context
+
+    def subscribe_control_commands(self, buffer_size, policy):
+        return self._control_events.subscribe(buffer_size, policy)
+
+    def unsubscribe_control_commands(self, subscription):
+        self._control_events.unsubscribe(subscription)
+
+    def get_client_connections(self):
+        return self._connections.snapshot()
 
     def start(self):
         print('Initialize proxy server')
@@ -129,6 +332,11 @@ class ProxyServer():
             return False
 
         self._init_grpc_server()
+        self._backends.start()
+        if self._history:
+            self._history.start()
+        if self._watcher:
+            self._watcher.start()
 
         def sigint_handler(sig, frame):
             self.stop()
@@ -146,57 +354,201 @@ class ProxyServer():
 
     def stop(self):
         print('Stop proxy server')
+        if self._watcher:
+            self._watcher.stop()
+        self._backends.stop()
         self._destroy_ied_server()
+        if self._history:
+            self._history.stop()
+        if self._recorder:
+            self._recorder.close()
 
         # destroy dynamic data model
-        iec61850.IedModel_destroy(self._model['inst'])
+        iec61850.IedModel_destroy(self._model.inst)
 
     def restart_ied_server(self):
         print('Restart IED server')
-        self._destroy_ied_server()
-        # Must reload model as it will also be destroyed in _destroy_ied_server
-        self._model = load_model(self._model_config)
-        self._init_ied_server()
+        with self._mutation_lock:
+            self._swap_ied_server(self._load_model())
 
     def update_value(self, values):
         print('Update value: {}'.format(values))
-        iec61850.IedServer_lockDataModel(self._ied_server)
-
-        for da_path, value in values.items():
-            da_info = find_data_attribute(self._model, da_path)
-            updater = UPDATERS[da_info['data_type']]
-            updater(self._ied_server, da_info['inst'], value)
-
-        iec61850.IedServer_unlockDataModel(self._ied_server)
+        with self._lock:
+            iec61850.IedServer_lockDataModel(self._ied_server)
+
+            for da_path, value in values.items():
+                da_info = find_data_attribute(self._model, da_path)
+                updater = UPDATERS[da_info.data_type]
+                updater(self._ied_server, da_info.inst, value)
+                self._values[da_path] = value
+
+            iec61850.IedServer_unlockDataModel(self._ied_server)
+
+        if self._history:
+            self._history.record(values)
+
+    def get_point_history(self, da_path, start, end):
+        if self._history is None:
+            raise KeyError(da_path)
+        return self._history.query(da_path, start, end)
+
+    def get_point_values(self, paths, prefixes, logical_devices, from_model=False,
+                         chunk_size=1000):
+        """Yield lists of at most chunk_size (path, data type, value)."""
+        paths = set(paths)
+        prefixes = tuple(prefixes) + tuple(ld + '/' for ld in logical_devices)
+
+        def is_selected(da_path):
+            return da_path in paths or da_path.startswith(prefixes)
+
+        with self._lock:
+            selected = [da_path for da_path in self._model.data_attributes if is_selected(da_path)]
+
+        # the locks are released between chunks, updates and controls are not blocked by a
+        # large selection; the model may be swapped meanwhile, so the paths are looked up again
+        for i in range(0, len(selected), chunk_size):
+            chunk = selected[i:i + chunk_size]
+            values = []
+            with self._lock:
+                if from_model:
+                    iec61850.IedServer_lockDataModel(self._ied_server)
+                for da_path in chunk:
+                    da_info = self._model.data_attributes.get(da_path)
+                    if da_info is None:
+                        continue
+                    if from_model:
+                        values.append((da_path, da_info.data_type, READERS[da_info.data_type](
+                            iec61850.IedServer_getAttributeValue(self._ied_server, da_info.inst))))
+                    elif da_path in self._values:
+                        # points which have never been written are not in the cache
+                        values.append((da_path, da_info.data_type, self._values[da_path]))
+                if from_model:
+                    iec61850.IedServer_unlockDataModel(self._ied_server)
+            if values:
+                yield values
 
     def _save_model_config(self):
         print('Save model config to {}'.format(self._config_path))
-        with open(self._config_path, 'w') as f:
-            json.dump(self._model_config, f, indent=2)
+        self._model_config.save(self._config_path)
+        if self._watcher:
+            self._watcher.ignore_current()
+
+    def add_logical_devices(self, _devices, templates=None):
+        with self._mutation_lock:
+            self._add_logical_devices(_devices, templates)
+
+    def reset_logical_devices(self, devices, templates=None):
+        with self._mutation_lock:
+            self._reset_logical_devices(devices, templates)
 
-    def add_logical_devices(self, _devices):
+    def reload_model_config(self):
+        with self._mutation_lock:
+            return self._reload_model_config()
+
+    def _add_logical_devices(self, _devices, templates):
         print('Add logical devices: {}'.format(_devices))
-        devices = list(filter(lambda d: d['name'] not in self._model['logical_devices'], _devices))
-        self._model_config['logical_devices'].extend(devices)
-        for device in devices:
-            load_logical_device(self._model, device)
+        # everything which can be rejected is done before the model and the config change
+        compiled = self._merge_templates(templates)
+        resolved_devices = {}
+        entries = []  # the entries as given, limited to the codes which are added
+        for entry in _devices:
+            codes = []
+            for device in expand_logical_devices([entry]):
+                name = device['name']
+                if name not in self._model.logical_devices and name not in resolved_devices:
+                    resolved_devices[name] = resolve_logical_device(device, compiled)
+                    codes.append(device.get('code'))
+            if not codes:
+                continue
+            if 'codes' in entry or 'code_range' in entry:
+                entry = {'name': entry['name'], 'template': entry['template'], 'codes': codes}
+            entries.append(entry)
+        with self._lock:
+            for resolved in resolved_devices.values():
+                load_logical_device(self._model, resolved)
+            # entries sharing a name format with saved ones are merged by the config
+            for entry in entries:
+                self._model_config.add_logical_device(entry)
+            self._update_history()
+        self._commit_templates(compiled, templates)
         self._save_model_config()
 
-    def reset_logical_devices(self, devices):
+    def _reset_logical_devices(self, devices, templates):
         print('Reset logical devices')
-        self._model_config['logical_devices'] = devices
-        model = load_model(self._model_config)
-
-        self._destroy_ied_server()
-        self._model = model
-        self._init_ied_server()
+        compiled = self._merge_templates(templates)
+        # a model which cannot be built is destroyed by load_model, nothing has changed then
+        model = load_model(self._model_config.name, devices, compiled)
+        self._swap_ied_server(model)
+        self._commit_templates(compiled, templates)
+        self._model_config.reset_logical_devices(devices)
         self._save_model_config()
 
+    def _reload_model_config(self):
+        print('Reload model config from {}'.format(self._config_path))
+        # parse and validate everything before the running server is touched
+        try:
+            model_config = CompactConfig.load(self._config_path)
+            templates = compile_templates(model_config.get('templates', {}), validate_logical_nodes)
+            for device in expand_logical_devices(model_config.iter_logical_devices()):
+                validate_logical_nodes(resolve_logical_device(device, templates)['logical_nodes'])
+        except Exception as e:
+            print('Invalid model config, keep the running model: {}'.format(e))
+            METRICS.increase('config_reload_failures')
+            return False
+
+        ignored = [key for key in set(model_config.header) | set(self._model_config.header)
+                   if key not in ['name', 'templates']
+                   and model_config.get(key) != self._model_config.get(key)]
+        if ignored:
+            print('Changes of {} need a restart of the proxy, not applied'.format(sorted(ignored)))
+        # the running values are kept, they are saved and compared with later reloads
+        for key in ignored:
+            if key in self._model_config.header:
+                model_config.header[key] = self._model_config.header[key]
+            else:
+                del model_config.header[key]
+
+        added, removed, changed = self._model_config.diff_logical_devices(model_config)
+        old_templates = self._model_config.get('templates', {})
+        new_templates = model_config.get('templates', {})
+        templates_changed = any(
+            new_templates.get(name) != template for name, template in old_templates.items())
+        if model_config.name != self._model_config.name or removed or changed or templates_changed:
+            print('Swap IED server, removed: {}, changed: {}'.format(removed, changed))
+            self._swap_ied_server(load_model(
+                model_config.name, model_config.iter_logical_devices(), templates))
+            self._model_config, self._templates = model_config, templates
+        else:
+            # templates were only added, the running devices do not change
+            self._model_config.header['templates'] = new_templates
+            self._templates = templates
+            print('Add logical devices: {}'.format(added))
+            with self._lock:
+                for name in added:
+                    device = model_config.get_logical_device(name)
+                    self._model_config.add_logical_device(device)
+                    for ld_config in expand_logical_devices([device]):
+                        if ld_config['name'] in self._model.logical_devices:
+                            continue
+                        load_logical_device(
+                            self._model, resolve_logical_device(ld_config, templates))
+                self._update_history()
+        METRICS.increase('config_reloads')
+        return True
+
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config-path', default='config/points.json')
+    parser.add_argument('--iec-address', help='local IP address of the MMS server, default all')
+    parser.add_argument('--iec-port', default=102, type=int)
+    parser.add_argument('--grpc-port', default=61850, type=int)
+    args = parser.parse_args()
+
     ancillary_backend_server_address = os.environ.get('ANCILLARY_BACKEND_SERVER_ADDRESS', 'localhost:61852')
     print('ancillary_backend_server_address: {}'.format(ancillary_backend_server_address))
-    server = ProxyServer('config/points.json', ancillary_backend_server_address)
+    server = ProxyServer(args.config_path, ancillary_backend_server_address,
+                         args.iec_port, args.grpc_port, args.iec_address)
     if not server.start():
         exit(1)
 
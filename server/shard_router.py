@@ -0,0 +1,267 @@
+import json
+import re
+import threading
+
+import grpc
+import taipower_ancillary_pb2
+import taipower_ancillary_pb2_grpc
+
+from control_events import Subscription
+from metrics import METRICS
+from proto_servicer import DEFAULT_SUBSCRIPTION_BUFFER_SIZE, SLOW_CONSUMER_POLICIES
+
+
+SHARD_CONFIG_DEFAULTS = {
+    'name': None,
+    'config_path': None,  # points.json of the logical devices served by the shard
+    'prefix': None,  # logical device name prefix, e.g. ASG0001
+    'pattern': None,  # regular expression matching the whole logical device name
+    'iec_address': None,  # local IP address of the MMS server, default all
+    'iec_port': 102,
+    'grpc_port': None,  # port of the worker, only the supervisor connects to it
+}
+
+
+def load_shard_config(config):
+    shard_config = dict(SHARD_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in shard_config:
+            raise ValueError('Unknown shard config: {}'.format(key))
+        shard_config[key] = value
+
+    for key in ['name', 'config_path']:
+        if not isinstance(shard_config[key], str):
+            raise ValueError('Shard config {} is required, got {!r}'.format(key, config))
+    if (shard_config['prefix'] is None) == (shard_config['pattern'] is None):
+        raise ValueError('Shard config needs either a prefix or a pattern, got {!r}'.format(config))
+    if shard_config['pattern'] is not None:
+        shard_config['pattern'] = re.compile(shard_config['pattern'])
+    for key in ['iec_port', 'grpc_port']:
+        if type(shard_config[key]) is not int or shard_config[key] <= 0:
+            raise ValueError('Shard config {} of {} must be a positive integer, got {!r}'.format(
+                key, shard_config['name'], shard_config[key]))
+
+    return shard_config
+
+
+def load_shard_configs(configs):
+    shard_configs = list(map(load_shard_config, configs))
+    if not shard_configs:
+        raise ValueError('No shard is configured')
+    names = [config['name'] for config in shard_configs]
+    if len(set(names)) != len(names):
+        raise ValueError('Shard names must be unique, got {}'.format(names))
+    grpc_ports = [config['grpc_port'] for config in shard_configs]
+    if len(set(grpc_ports)) != len(grpc_ports):
+        raise ValueError('Shard gRPC ports must be unique, got {}'.format(grpc_ports))
+    iec_endpoints = [(config['iec_address'], config['iec_port']) for config in shard_configs]
+    if len(set(iec_endpoints)) != len(iec_endpoints):
+        raise ValueError('Shard MMS addresses must be unique, got {}'.format(iec_endpoints))
+    return shard_configs
+
+
+def logical_device_of(path):
+    return path.split('/', 1)[0]
+
+
+class Shard():
+    def __init__(self, config):
+        self.name = config['name']
+        self.config = config
+        self._channel = grpc.insecure_channel('localhost:{}'.format(config['grpc_port']))
+        self.stub = taipower_ancillary_pb2_grpc.AncillaryInputsStub(self._channel)
+
+    def owns(self, ld_name):
+        if self.config['prefix'] is not None:
+            return ld_name.startswith(self.config['prefix'])
+        return self.config['pattern'].fullmatch(ld_name) is not None
+
+    def close(self):
+        self._channel.close()
+
+
+class ShardRouter():
+    def __init__(self, shard_configs):
+        self.shards = [Shard(config) for config in shard_configs]
+
+    def resolve(self, ld_name):
+        for shard in self.shards:
+            if shard.owns(ld_name):
+                return shard
+        raise KeyError(ld_name)
+
+    def group(self, items, ld_name_of):
+        """Group items by the shard of their logical device, in the order of the shards."""
+        groups = {shard.name: [] for shard in self.shards}
+        for item in items:
+            groups[self.resolve(ld_name_of(item)).name].append(item)
+        return [(shard, groups[shard.name]) for shard in self.shards]
+
+    def close(self):
+        for shard in self.shards:
+            shard.close()
+
+
+class ShardRouterServicer(taipower_ancillary_pb2_grpc.AncillaryInputsServicer):
+    """Serve AncillaryInputs of the supervisor by forwarding to the shard owning each device."""
+
+    def __init__(self, router, timeout):
+        self._router = router
+        self._timeout = timeout
+
+    def _call(self, context, shard, method, request, note=''):
+        try:
+            return getattr(shard.stub, method)(request, timeout=self._timeout)
+        except grpc.RpcError as e:
+            METRICS.increase('shard_rpc_errors.{}'.format(shard.name))
+            context.abort(e.code(), 'Shard {}: {}{}'.format(shard.name, e.details(), note))
+
+    def _group(self, context, items, ld_name_of):
+        try:
+            return self._router.group(items, ld_name_of)
+        except KeyError as e:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No shard serves logical device {}'.format(e))
+
+    def _group_logical_devices(self, context, devices):
+        # devices created from codes may belong to several shards, split the codes
+        def split(device):
+            if not device.codes:
+                yield device
+                return
+            for code in device.codes:
+                yield taipower_ancillary_pb2.LogicalDevice(
+                    name=device.name, template=device.template, codes=[code])
+
+        def ld_name_of(device):
+            return device.name.format(code=device.codes[0]) if device.codes else device.name
+
+        groups = []
+        for shard, shard_devices in self._group(
+                context, [d for device in devices for d in split(device)], ld_name_of):
+            merged = {}
+            for device in shard_devices:
+                key = (device.name, device.template) if device.codes else id(device)
+                if key in merged:
+                    merged[key].codes.extend(device.codes)
+                else:
+                    merged[key] = device
+            groups.append((shard, list(merged.values())))
+        return groups
+
+    def update_point_values(self, request, context):
+        values = json.loads(request.values)
+        for shard, paths in self._group(context, values, logical_device_of):
+            if paths:
+                self._call(context, shard, 'update_point_values',
+                           taipower_ancillary_pb2.UpdatePointValuesRequest(
+                               values=json.dumps({path: values[path] for path in paths})))
+        return taipower_ancillary_pb2.Response(success=True)
+
+    def add_logical_devices(self, request, context):
+        for shard, devices in self._group_logical_devices(context, request.devices):
+            if devices:
+                self._call(context, shard, 'add_logical_devices',
+                           taipower_ancillary_pb2.AddLogicalDevicesRequest(
+                               devices=devices, templates=request.templates))
+        return taipower_ancillary_pb2.Response(success=True)
+
+    def reset_logical_devices(self, request, context):
+        # every shard is reset, the ones without devices become empty; the shards are reset
+        # one after the other, a failure leaves the ones before it reset
+        reset = []
+        for shard, devices in self._group_logical_devices(context, request.devices):
+            self._call(context, shard, 'reset_logical_devices',
+                       taipower_ancillary_pb2.ResetLogicalDevicesRequest(
+                           devices=devices, templates=request.templates),
+                       note=' (not atomic, already reset: {})'.format(reset) if reset else '')
+            reset.append(shard.name)
+        return taipower_ancillary_pb2.Response(success=True)
+
+    def restart_ied_server(self, request, context):
+        for shard in self._router.shards:
+            self._call(context, shard, 'restart_ied_server', request)
+        return taipower_ancillary_pb2.Response(success=True)
+
+    def get_metrics(self, request, context):
+        metrics = {'supervisor': METRICS.snapshot(), 'shards': {}}
+        for shard in self._router.shards:
+            try:
+                response = shard.stub.get_metrics(request, timeout=self._timeout)
+                metrics['shards'][shard.name] = json.loads(response.metrics)
+            except grpc.RpcError as e:
+                # a restarting shard must not hide the metrics of the others
+                metrics['shards'][shard.name] = {'error': str(e.code())}
+        return taipower_ancillary_pb2.GetMetricsResponse(metrics=json.dumps(metrics))
+
+    def get_client_connections(self, request, context):
+        connections = []
+        for shard in self._router.shards:
+            response = self._call(context, shard, 'get_client_connections', request)
+            connections.extend(dict(connection, shard=shard.name)
+                               for connection in json.loads(response.connections))
+        return taipower_ancillary_pb2.GetClientConnectionsResponse(
+            connections=json.dumps(connections))
+
+    def get_point_values(self, request, context):
+        path_groups = dict((shard.name, paths) for shard, paths in self._group(
+            context, request.paths, logical_device_of))
+        ld_groups = dict((shard.name, lds) for shard, lds in self._group(
+            context, request.logical_devices, lambda ld: ld))
+        for shard in self._router.shards:
+            # a prefix within a logical device goes to its shard, a shorter one to all shards
+            prefixes = [prefix for prefix in request.prefixes
+                        if '/' not in prefix or shard.owns(logical_device_of(prefix))]
+            if not (path_groups[shard.name] or ld_groups[shard.name] or prefixes):
+                continue
+            try:
+                yield from shard.stub.get_point_values(
+                    taipower_ancillary_pb2.GetPointValuesRequest(
+                        paths=path_groups[shard.name], prefixes=prefixes,
+                        logical_devices=ld_groups[shard.name], from_model=request.from_model,
+                        batch_size=request.batch_size),
+                    timeout=self._timeout)
+            except grpc.RpcError as e:
+                METRICS.increase('shard_rpc_errors.{}'.format(shard.name))
+                context.abort(e.code(), 'Shard {}: {}'.format(shard.name, e.details()))
+
+    def get_point_history(self, request, context):
+        try:
+            shard = self._router.resolve(logical_device_of(request.path))
+        except KeyError:
+            context.abort(grpc.StatusCode.NOT_FOUND, 'No history for {}'.format(request.path))
+        return self._call(context, shard, 'get_point_history', request)
+
+    def watch_control_commands(self, request, context):
+        # the readers of the shards never block, a slow client is handled by its policy
+        subscription = Subscription(request.buffer_size or DEFAULT_SUBSCRIPTION_BUFFER_SIZE,
+                                    SLOW_CONSUMER_POLICIES[request.policy])
+        errors = []
+        calls = [shard.stub.watch_control_commands(request) for shard in self._router.shards]
+
+        def pump(call):
+            try:
+                for command in call:
+                    subscription.offer(command)
+            except grpc.RpcError as e:
+                if e.code() != grpc.StatusCode.CANCELLED:
+                    errors.append(e)
+                    subscription.close()
+
+        threads = [threading.Thread(target=pump, args=(call,), daemon=True) for call in calls]
+        for thread in threads:
+            thread.start()
+        try:
+            while context.is_active():
+                command = subscription.get(timeout=1)
+                if errors:
+                    # resubscribing is up to the client, as with a single proxy server
+                    context.abort(errors[0].code(), errors[0].details())
+                if subscription.closed:
+                    context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                  'Subscriber is too slow, control commands were not consumed')
+                if command is not None:
+                    yield command
+        finally:
+            subscription.close()
+            for call in calls:
+                call.cancel()
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+import grpc
+import taipower_ancillary_pb2_grpc
+
+from concurrent import futures
+from metrics import METRICS
+from shard_router import ShardRouter, ShardRouterServicer, load_shard_configs
+
+
+PROXY_SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'proxy_server.py')
+
+SUPERVISOR_CONFIG_DEFAULTS = {
+    'grpc_port': 61850,  # the AncillaryInputs endpoint routing to the shards
+    'max_workers': 10,
+    'timeout': 30,  # seconds, of the calls forwarded to a shard
+    'restart_delay': 1,  # seconds, doubled for every crash in a row
+    'max_restart_delay': 60,
+    'shards': [],
+}
+
+
+def load_supervisor_config(config):
+    supervisor_config = dict(SUPERVISOR_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in supervisor_config:
+            raise ValueError('Unknown supervisor config: {}'.format(key))
+        supervisor_config[key] = value
+
+    for key in ['grpc_port', 'max_workers', 'timeout', 'restart_delay', 'max_restart_delay']:
+        if not isinstance(supervisor_config[key], (int, float)) or supervisor_config[key] <= 0:
+            raise ValueError('Supervisor config {} must be positive, got {!r}'.format(
+                key, supervisor_config[key]))
+    supervisor_config['shards'] = load_shard_configs(supervisor_config['shards'])
+    shard_ports = [shard['grpc_port'] for shard in supervisor_config['shards']]
+    if supervisor_config['grpc_port'] in shard_ports:
+        raise ValueError('Supervisor gRPC port {} is used by a shard'.format(
+            supervisor_config['grpc_port']))
+
+    return supervisor_config
+
+
+class Worker():
+    """A ProxyServer process serving the logical devices of one shard."""
+
+    def __init__(self, shard_config, restart_delay, max_restart_delay):
+        self.name = shard_config['name']
+        self._shard_config = shard_config
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._process = None
+        self._started_at = None
+        self._crashes = 0  # in a row
+        self._restart_at = None
+
+    def start(self):
+        config = self._shard_config
+        args = [sys.executable, '-u', PROXY_SERVER,
+                '--config-path', config['config_path'],
+                '--iec-port', str(config['iec_port']),
+                '--grpc-port', str(config['grpc_port'])]
+        if config['iec_address']:
+            args += ['--iec-address', config['iec_address']]
+        print('Start worker {}: {}'.format(self.name, ' '.join(args)))
+        self._process = subprocess.Popen(args)
+        self._started_at = time.monotonic()
+        self._restart_at = None
+
+    def check(self):
+        """Restart the worker once its restart delay has passed after it exited."""
+        if self._restart_at is not None:
+            if time.monotonic() >= self._restart_at:
+                METRICS.increase('worker_restarts.{}'.format(self.name))
+                self.start()
+            return
+
+        returncode = self._process.poll()
+        if returncode is None:
+            return
+        uptime = time.monotonic() - self._started_at
+        # a worker that ran for a while is not crash looping
+        self._crashes = 1 if uptime > self._max_restart_delay else self._crashes + 1
+        delay = min(self._restart_delay * 2 ** (self._crashes - 1), self._max_restart_delay)
+        print('Worker {} exited with {} after {:.1f}s, restart in {}s'.format(
+            self.name, returncode, uptime, delay))
+        METRICS.increase('worker_exits.{}'.format(self.name))
+        self._restart_at = time.monotonic() + delay
+
+    def stop(self, timeout=10):
+        if self._process is None or self._process.poll() is not None:
+            return
+        print('Stop worker {}'.format(self.name))
+        # the proxy server shuts down on SIGINT
+        self._process.send_signal(signal.SIGINT)
+        try:
+            self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            print('Kill worker {}'.format(self.name))
+            self._process.kill()
+            self._process.wait()
+
+
+class Supervisor():
+    def __init__(self, config):
+        self._config = config
+        self._stopped = threading.Event()
+        self._workers = [
+            Worker(shard, config['restart_delay'], config['max_restart_delay'])
+            for shard in config['shards']
+        ]
+        self._router = ShardRouter(config['shards'])
+
+    def _init_grpc_server(self):
+        print('Start gRPC server at port {}'.format(self._config['grpc_port']))
+        self._grpc_server = grpc.server(
+            futures.ThreadPoolExecutor(max_workers=self._config['max_workers']))
+        taipower_ancillary_pb2_grpc.add_AncillaryInputsServicer_to_server(
+            ShardRouterServicer(self._router, self._config['timeout']), self._grpc_server)
+        self._grpc_server.add_insecure_port('[::]:{}'.format(self._config['grpc_port']))
+
+    def start(self):
+        print('Initialize supervisor')
+        for worker in self._workers:
+            worker.start()
+        self._init_grpc_server()
+        self._grpc_server.start()
+
+        def stop_handler(sig, frame):
+            self._stopped.set()
+
+        signal.signal(signal.SIGINT, stop_handler)
+        signal.signal(signal.SIGTERM, stop_handler)
+
+    def run(self):
+        print('Run supervisor')
+        while not self._stopped.wait(0.5):
+            for worker in self._workers:
+                worker.check()
+
+    def stop(self):
+        print('Stop supervisor')
+        self._grpc_server.stop(None)
+        for worker in self._workers:
+            worker.stop()
+        self._router.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config-path', default='config/shards.json')
+    args = parser.parse_args()
+
+    with open(args.config_path) as f:
+        config = load_supervisor_config(json.load(f))
+    supervisor = Supervisor(config)
+    supervisor.start()
+    supervisor.run()
+    supervisor.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    main()
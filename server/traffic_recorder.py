@@ -0,0 +1,83 @@
+import gzip
+import json
+import threading
+import time
+
+
+RECORDER_CONFIG_DEFAULTS = {
+    'path': None,  # compressed with gzip when it ends with .gz
+    'updates': True,
+    'controls': True,
+    'flush_interval': 1,  # seconds
+}
+
+
+def load_recorder_config(config):
+    recorder_config = dict(RECORDER_CONFIG_DEFAULTS)
+    for key, value in config.items():
+        if key not in recorder_config:
+            raise ValueError('Unknown recorder config: {}'.format(key))
+        recorder_config[key] = value
+
+    if not isinstance(recorder_config['path'], str):
+        raise ValueError('Recorder config path is required, got {!r}'.format(config))
+    if not isinstance(recorder_config['flush_interval'], (int, float)) or \
+            recorder_config['flush_interval'] <= 0:
+        raise ValueError('Recorder config flush_interval must be positive, got {!r}'.format(
+            recorder_config['flush_interval']))
+
+    return recorder_config
+
+
+def open_traffic_log(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't')
+    return open(path, mode)
+
+
+def read_traffic_log(path):
+    """Yield the recorded events, {"t", "update": values} or {"t", "control": command}."""
+    with open_traffic_log(path, 'r') as f:
+        try:
+            for line in f:
+                if not line.endswith('\n'):
+                    # the last line of a killed recorder may be cut
+                    break
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # a .gz log of a recorder which did not close it ends without a gzip trailer
+            print('Traffic log {} is truncated, read up to its end'.format(path))
+
+
+class TrafficRecorder():
+    """Append inbound update batches and received control commands to a JSON lines log."""
+
+    def __init__(self, config):
+        self._config = config
+        self._lock = threading.Lock()
+        self._f = open_traffic_log(config['path'], 'a')
+        self._flushed_at = time.monotonic()
+
+    def _write(self, event):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(line)
+            # a crash loses at most flush_interval of traffic
+            if time.monotonic() - self._flushed_at >= self._config['flush_interval']:
+                self._f.flush()
+                self._flushed_at = time.monotonic()
+
+    def record_update(self, values):
+        if self._config['updates']:
+            self._write({'t': time.time(), 'update': values})
+
+    def record_control(self, command):
+        if self._config['controls']:
+            self._write({'t': command['received_at'], 'control': command})
+
+    def close(self):
+        with self._lock:
+            self._f.close()
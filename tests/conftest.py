@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the server modules are imported by plain name, as in the server image
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'server'))
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from admission import (HIGH_PRIORITY, NORMAL_PRIORITY, AdmissionController, AdmissionGate,
+                       load_admission_config)
+
+
+def wait_for_waiters(gate, count):
+    deadline = time.monotonic() + 5
+    while len(gate._waiting) < count and time.monotonic() < deadline:
+        time.sleep(0.001)
+    assert len(gate._waiting) == count
+
+
+def test_waiters_are_admitted_by_priority_then_arrival():
+    gate = AdmissionGate('test', limit=1, queue_size=10, timeout=5)
+    assert gate.acquire()
+    order = []
+
+    def call(name, priority):
+        assert gate.acquire(priority)
+        order.append(name)
+        gate.release()
+
+    threads = []
+    for i, (name, priority) in enumerate([('bulk1', NORMAL_PRIORITY), ('bulk2', NORMAL_PRIORITY),
+                                          ('ack', HIGH_PRIORITY)]):
+        thread = threading.Thread(target=call, args=(name, priority))
+        thread.start()
+        threads.append(thread)
+        wait_for_waiters(gate, i + 1)
+    gate.release()
+    for thread in threads:
+        thread.join(5)
+    assert order == ['ack', 'bulk1', 'bulk2']
+
+
+def test_full_queue_is_shed():
+    gate = AdmissionGate('test', limit=1, queue_size=1, timeout=5)
+    assert gate.acquire()
+    waiter = threading.Thread(target=lambda: gate.acquire() and gate.release())
+    waiter.start()
+    wait_for_waiters(gate, 1)
+    assert gate.acquire() is False
+    gate.release()
+    waiter.join(5)
+
+
+def test_waiter_is_shed_after_the_timeout():
+    gate = AdmissionGate('test', limit=1, queue_size=1, timeout=0.01)
+    assert gate.acquire()
+    assert gate.acquire() is False
+    assert gate._waiting == []
+
+
+def test_priority_of_updates():
+    controller = AdmissionController(load_admission_config({}))
+    assert controller.priority_of({'ASG00001/SUPGGIO03.Ind1.stVal': True}) == HIGH_PRIORITY
+    assert controller.priority_of({'ASR00001/SPIMMXU01.TotW.mag.i': 1}) == NORMAL_PRIORITY
+
+
+def test_subscribers_are_bounded():
+    controller = AdmissionController(load_admission_config({'max_subscribers': 1}))
+    with controller.admit_subscriber() as first:
+        with controller.admit_subscriber() as second:
+            assert (first, second) == (True, False)
+    with controller.admit_subscriber() as again:
+        assert again
+
+
+def test_max_concurrent_rpcs_leaves_room_for_the_threads():
+    with pytest.raises(ValueError, match='max_concurrent_rpcs'):
+        load_admission_config({'max_workers': 10, 'max_concurrent_rpcs': 10})
+    assert load_admission_config({'max_concurrent_rpcs': None})['max_concurrent_rpcs'] is None
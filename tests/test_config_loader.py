@@ -0,0 +1,154 @@
+import io
+import json
+
+import pytest
+
+from config_loader import (CompactConfig, compile_templates, expand_logical_devices,
+                           iter_model_config, iter_resolved_logical_devices,
+                           resolve_logical_device)
+
+
+TEMPLATES = {
+    'ASR': {'logical_nodes': [{'name': 'LLN0', 'data_objects': [{'name': 'Mod', 'cdc': 'ENS'}]}]},
+    'CODED': {'logical_nodes': [{'name': 'GGIO{code:02d}'}]},
+}
+
+
+def expanded_names(config):
+    return [device['name'] for device in expand_logical_devices(config.iter_logical_devices())]
+
+
+def test_iter_model_config_yields_devices_one_by_one():
+    f = io.StringIO(json.dumps({
+        'name': 'test',
+        'logical_devices': [{'name': 'A', 'logical_nodes': []}, {'name': 'B'}],
+        'server': {'edition': '2'},
+    }))
+    assert list(iter_model_config(f)) == [
+        ('name', 'test'),
+        ('logical_device', {'name': 'A', 'logical_nodes': []}),
+        ('logical_device', {'name': 'B'}),
+        ('server', {'edition': '2'}),
+    ]
+
+
+def test_iter_model_config_without_devices():
+    f = io.StringIO('{"name": "test", "logical_devices": []}')
+    assert list(iter_model_config(f)) == [('name', 'test')]
+
+
+def test_expand_codes_and_code_range():
+    devices = [
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1, 3]},
+        {'name': 'SENSOR{code:03d}', 'template': 'ASR', 'code_range': [1, 2]},
+        {'name': 'PLAIN', 'logical_nodes': []},
+    ]
+    assert [d['name'] for d in expand_logical_devices(devices)] == [
+        'ASR00001', 'ASR00003', 'SENSOR001', 'SENSOR002', 'PLAIN']
+
+
+def test_entries_with_the_same_name_format_are_merged():
+    config = CompactConfig({'name': 'test'}, [
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1, 2]},
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'code_range': [2, 4]},
+    ])
+    assert expanded_names(config) == ['ASR00001', 'ASR00002', 'ASR00003', 'ASR00004']
+
+
+def test_entries_with_the_same_name_format_and_other_templates_are_kept():
+    config = CompactConfig({'name': 'test'}, [
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1]},
+        {'name': 'ASR{code:05d}', 'template': 'CODED', 'codes': [2]},
+    ])
+    assert sorted(expanded_names(config)) == ['ASR00001', 'ASR00002']
+
+
+def test_load_merges_colliding_entries(tmp_path):
+    path = tmp_path / 'points.json'
+    path.write_text(json.dumps({'name': 'test', 'logical_devices': [
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1]},
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [2]},
+    ]}))
+    assert expanded_names(CompactConfig.load(str(path))) == ['ASR00001', 'ASR00002']
+
+
+def test_iter_resolved_logical_devices(tmp_path):
+    path = tmp_path / 'points.json'
+    path.write_text(json.dumps({'name': 'test', 'templates': TEMPLATES, 'logical_devices': [
+        {'name': 'PLAIN', 'logical_nodes': []},
+        {'name': 'ASR{code:05d}', 'template': 'CODED', 'codes': [1]},
+    ]}))
+    header = {}
+    assert list(iter_resolved_logical_devices(str(path), header)) == [
+        {'name': 'PLAIN', 'logical_nodes': []},
+        {'name': 'ASR00001', 'logical_nodes': [{'name': 'GGIO01'}]},
+    ]
+    assert header == {'name': 'test', 'templates': TEMPLATES}
+
+
+@pytest.mark.parametrize('key', ['name', 'templates'])
+def test_iter_resolved_logical_devices_needs_the_header_first(tmp_path, key):
+    config = {'name': 'test', 'templates': TEMPLATES}
+    value = config.pop(key)
+    path = tmp_path / 'points.json'
+    path.write_text(json.dumps(dict(config, logical_devices=[
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1]}], **{key: value})))
+    with pytest.raises(ValueError, match='{} must come before logical_devices'.format(key)):
+        list(iter_resolved_logical_devices(str(path), {}))
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'points.json')
+    devices = [{'name': 'PLAIN', 'logical_nodes': [{'name': 'LLN0'}]},
+               {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1]}]
+    CompactConfig({'name': 'test', 'templates': TEMPLATES}, devices).save(path)
+    config = CompactConfig.load(path)
+    assert config.name == 'test'
+    assert config.get('templates') == TEMPLATES
+    assert list(config.iter_logical_devices()) == devices
+    assert [p.name for p in tmp_path.iterdir()] == ['points.json']
+
+
+def test_save_replaces_the_file_and_keeps_its_mode(tmp_path):
+    path = tmp_path / 'points.json'
+    path.write_text('{}')
+    path.chmod(0o640)
+    CompactConfig({'name': 'test'}).save(str(path))
+    assert json.loads(path.read_text()) == {'name': 'test', 'logical_devices': []}
+    assert path.stat().st_mode & 0o777 == 0o640
+    assert [p.name for p in tmp_path.iterdir()] == ['points.json']
+
+
+def test_diff_logical_devices():
+    old = CompactConfig({'name': 'test'}, [
+        {'name': 'A', 'logical_nodes': []},
+        {'name': 'B', 'logical_nodes': []},
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1]},
+    ])
+    new = CompactConfig({'name': 'test'}, [
+        {'name': 'A', 'logical_nodes': []},
+        {'name': 'C', 'logical_nodes': []},
+        {'name': 'ASR{code:05d}', 'template': 'ASR', 'codes': [1, 2]},
+    ])
+    added, removed, changed = old.diff_logical_devices(new)
+    assert added == ['C']
+    assert removed == ['B']
+    assert changed == [('ASR{code:05d}', 'ASR')]
+    assert old.diff_logical_devices(old) == ([], [], [])
+
+
+def test_resolve_substitutes_the_code():
+    templates = compile_templates(TEMPLATES)
+    device = {'name': 'ASR00007', 'template': 'CODED', 'code': 7}
+    assert resolve_logical_device(device, templates)['logical_nodes'] == [{'name': 'GGIO07'}]
+
+
+def test_resolve_without_code_names_the_template():
+    templates = compile_templates(TEMPLATES)
+    with pytest.raises(ValueError, match='CODED.*PLAIN'):
+        resolve_logical_device({'name': 'PLAIN', 'template': 'CODED'}, templates)
+
+
+def test_resolve_unknown_template():
+    with pytest.raises(ValueError, match='Unknown template'):
+        resolve_logical_device({'name': 'X', 'template': 'MISSING'}, {})
@@ -0,0 +1,10 @@
+import filecmp
+import os
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def test_client_config_loader_is_the_server_one():
+    # the client image only gets client/, so the module is copied there and must not drift
+    assert filecmp.cmp(os.path.join(ROOT, 'server', 'config_loader.py'),
+                       os.path.join(ROOT, 'client', 'config_loader.py'), shallow=False)
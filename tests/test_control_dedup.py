@@ -0,0 +1,118 @@
+import threading
+import time
+
+import pytest
+
+from control_dedup import ControlDeduplicator, control_key, load_dedup_config
+
+
+def command(**fields):
+    return dict({'path': 'ASG00001/SUPGAPC02.SPCSO1', 'originator_category': 3,
+                 'control_number': 7, 'value': True, 'test': False}, **fields)
+
+
+class Backend():
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def forward(self):
+        self.calls += 1
+        return self.results.pop(0)
+
+
+def test_control_key():
+    assert control_key(command(), b'HMI') == (
+        'ASG00001/SUPGAPC02.SPCSO1', 3, b'HMI', 7, True, False)
+    assert control_key(command(), b'HMI') != control_key(command(control_number=8), b'HMI')
+    assert control_key(command(), b'HMI') != control_key(command(), b'SCADA')
+    assert control_key(command(), b'HMI') != control_key(command(test=True), b'HMI')
+    # structured values are made hashable
+    assert control_key(command(value={'b': 1, 'a': [2]}), None)[4] == '{"a": [2], "b": 1}'
+
+
+def test_control_key_without_control_number():
+    incomplete = command()
+    del incomplete['control_number']
+    assert control_key(incomplete, None) is None
+
+
+def test_load_dedup_config():
+    assert load_dedup_config({}) == {'window': 2.0, 'max_entries': 10000}
+    with pytest.raises(ValueError, match='Unknown'):
+        load_dedup_config({'ttl': 1})
+    with pytest.raises(ValueError, match='positive'):
+        load_dedup_config({'window': 0})
+
+
+def test_repeat_within_the_window_is_not_forwarded():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 60}))
+    backend = Backend(True)
+    assert dedup.run('key', backend.forward) is True
+    assert dedup.run('key', backend.forward) is True
+    assert backend.calls == 1
+
+
+def test_repeat_after_the_window_is_forwarded():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 0.01}))
+    backend = Backend(True, True)
+    dedup.run('key', backend.forward)
+    time.sleep(0.02)
+    dedup.run('key', backend.forward)
+    assert backend.calls == 2
+
+
+def test_failures_are_not_remembered():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 60}))
+    backend = Backend(False, True)
+    assert dedup.run('key', backend.forward) is False
+    assert dedup.run('key', backend.forward) is True
+    assert backend.calls == 2
+
+
+def test_exceptions_are_not_remembered():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 60}))
+
+    def broken():
+        raise RuntimeError('backend is down')
+
+    with pytest.raises(RuntimeError):
+        dedup.run('key', broken)
+    backend = Backend(True)
+    assert dedup.run('key', backend.forward) is True
+    assert backend.calls == 1
+
+
+def test_repeats_wait_for_the_command_being_forwarded():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 60}))
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return True
+
+    results = []
+    first = threading.Thread(target=lambda: results.append(dedup.run('key', slow)))
+    first.start()
+    started.wait(5)
+    repeats = [threading.Thread(target=lambda: results.append(dedup.run('key', slow)))
+               for _ in range(3)]
+    for thread in repeats:
+        thread.start()
+    release.set()
+    for thread in [first] + repeats:
+        thread.join(5)
+    assert results == [True] * 4
+    assert len(calls) == 1
+
+
+def test_oldest_entries_are_evicted():
+    dedup = ControlDeduplicator(load_dedup_config({'window': 60, 'max_entries': 2}))
+    backend = Backend(True, True, True, True)
+    for key in ['a', 'b', 'c']:
+        dedup.run(key, backend.forward)
+    dedup.run('a', backend.forward)
+    assert backend.calls == 4
@@ -0,0 +1,57 @@
+import pytest
+
+from history import HistoryStore, RingBuffer, load_history_config
+
+
+def test_query_returns_the_entries_in_range_oldest_first():
+    buffer = RingBuffer(4, 'i')
+    for t in range(3):
+        buffer.append(float(t), t * 10)
+    assert buffer.query(0, 3) == ([0.0, 1.0, 2.0], [0, 10, 20])
+    assert buffer.query(1, 2) == ([1.0], [10])
+    assert buffer.query(5, 6) == ([], [])
+
+
+def test_oldest_entries_are_overwritten():
+    buffer = RingBuffer(3, 'i')
+    for t in range(5):
+        buffer.append(float(t), t)
+    assert buffer.query(0, 10) == ([2.0, 3.0, 4.0], [2, 3, 4])
+
+
+def test_take_unspilled_returns_each_entry_once():
+    buffer = RingBuffer(3, 'f')
+    buffer.append(1.0, 0.5)
+    buffer.append(2.0, 1.5)
+    timestamps, values = buffer.take_unspilled()
+    assert list(timestamps) == [1.0, 2.0]
+    assert list(values) == [0.5, 1.5]
+    buffer.append(3.0, 2.5)
+    timestamps, values = buffer.take_unspilled()
+    assert list(timestamps) == [3.0]
+    assert list(buffer.take_unspilled()[0]) == []
+
+
+def test_unspilled_entries_are_bounded_by_the_capacity():
+    buffer = RingBuffer(2, 'B')
+    for t in range(5):
+        buffer.append(float(t), t % 2)
+    timestamps, values = buffer.take_unspilled()
+    assert list(timestamps) == [3.0, 4.0]
+    assert list(values) == [1, 0]
+
+
+def test_history_follows_the_data_types_of_the_model():
+    points = ['A/GGIO1.AnIn1.mag.f', 'A/GGIO1.Ind1.stVal']
+    store = HistoryStore(load_history_config({'points': points}),
+                         {'A/GGIO1.AnIn1.mag.f': 'float'})
+    store.record({'A/GGIO1.AnIn1.mag.f': 1.5, 'A/GGIO1.Ind1.stVal': True}, timestamp=1.0)
+    assert store.query('A/GGIO1.AnIn1.mag.f', 0, 2)[0] == 'float'
+    with pytest.raises(KeyError):
+        store.query('A/GGIO1.Ind1.stVal', 0, 2)
+
+    store.update_data_types({'A/GGIO1.Ind1.stVal': 'boolean'})
+    store.record({'A/GGIO1.Ind1.stVal': True}, timestamp=2.0)
+    assert store.query('A/GGIO1.Ind1.stVal', 0, 3) == ('boolean', [2.0], [1])
+    with pytest.raises(KeyError):
+        store.query('A/GGIO1.AnIn1.mag.f', 0, 2)